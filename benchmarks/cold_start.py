@@ -0,0 +1,136 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+import synthetic
+
+LAMBDA_DIR = Path(__file__).resolve().parent.parent / 'lambda' / 'monitor_service_quotas'
+
+# Measures what a cold start of the Lambda spends on imports, in a fresh interpreter per repetition.
+# Import time (python -X importtime) is split into the AWS SDK, the checker modules, the other Lambda
+# modules and the rest, and the first dispatch of a quota of each service is timed as well since
+# that is where lazily loaded checker modules get imported.
+#
+#   python benchmarks/cold_start.py
+#   python benchmarks/cold_start.py --baseline-dir base/lambda/monitor_service_quotas
+
+SDK_PACKAGES = {'boto3', 'botocore', 's3transfer', 'urllib3', 'dateutil', 'jmespath', 'six'}
+
+# runs in the fresh interpreter, prints the timings as JSON
+PROBE = '''
+import importlib.util, json, sys, time
+lambda_dir, quotas = sys.argv[1], json.loads(sys.argv[2])
+LEGACY_REGISTRIES = {'elasticfilesystem': 'efs_registry'}
+sys.path.insert(0, lambda_dir)
+start = time.perf_counter()
+spec = importlib.util.spec_from_file_location('monitor_service_quotas', lambda_dir + '/lambda.py')
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+imported_ms = (time.perf_counter() - start) * 1000
+dispatch_ms = {}
+for service_code, quota_code, quota_name in quotas:
+    if service_code in dispatch_ms:
+        continue
+    start = time.perf_counter()
+    if hasattr(module, 'registry'):
+        module.registry.get_checker(service_code, quota_code, quota_name)
+    else:
+        # older trees keep a registry per service, looked up by quota name only
+        registry = getattr(module, LEGACY_REGISTRIES.get(service_code, service_code + '_registry'), None)
+        if registry is None:
+            continue
+        registry.get_checker(quota_name)
+    dispatch_ms[service_code] = (time.perf_counter() - start) * 1000
+print(json.dumps({'import_ms': imported_ms, 'dispatch_ms': dispatch_ms}))
+'''
+
+def probe(lambda_dir):
+    env = {
+        **os.environ,
+        'AWS_DEFAULT_REGION': 'us-east-1',
+        'AWS_ACCESS_KEY_ID': 'synthetic',
+        'AWS_SECRET_ACCESS_KEY': 'synthetic',
+        'SERVICE_QUOTA_REGION_LIST': 'us-east-1',
+        'SERVICE_QUOTA_THRESHOLD': '80',
+        'LOG_LEVEL': 'CRITICAL',
+    }
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE, str(lambda_dir), json.dumps(synthetic.CHECKED_QUOTAS)],
+        capture_output=True, text=True, env=env, check=True
+    )
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+    result['groups'], result['checker_modules'] = import_groups(process.stderr, lambda_dir)
+    return result
+
+def import_groups(importtime, lambda_dir):
+    lambda_modules = {path.stem for path in Path(lambda_dir).glob('*.py')}
+    groups = {'aws sdk': 0.0, 'checker modules': 0.0, 'lambda modules': 0.0, 'other': 0.0}
+    checker_modules = []
+
+    # "import time: self [us] | cumulative | imported package", self times add up to the total
+    for line in importtime.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = (part.strip() for part in line[len('import time:'):].split('|'))
+        root = name.split('.')[0]
+        if root.endswith('_checks') and root in lambda_modules:
+            group = 'checker modules'
+            checker_modules.append(root)
+        elif root in lambda_modules:
+            group = 'lambda modules'
+        elif root in SDK_PACKAGES:
+            group = 'aws sdk'
+        else:
+            group = 'other'
+        groups[group] += int(self_us) / 1000
+    return groups, sorted(set(checker_modules))
+
+def summarize(runs):
+    return {
+        'import_ms': statistics.median(run['import_ms'] for run in runs),
+        'groups': {group: statistics.median(run['groups'][group] for run in runs) for group in runs[0]['groups']},
+        'dispatch_ms': {service: statistics.median(run['dispatch_ms'][service] for run in runs) for service in runs[0]['dispatch_ms']},
+        'checker_modules': runs[0]['checker_modules']
+    }
+
+def print_report(results):
+    labels = list(results)
+    print(f"{'':<32}" + ''.join(f"{label:>12}" for label in labels))
+    print(f"{'import lambda.py (ms)':<32}" + ''.join(f"{results[label]['import_ms']:>12.1f}" for label in labels))
+    for group in results[labels[0]]['groups']:
+        print(f"{'  ' + group + ' (ms)':<32}" + ''.join(f"{results[label]['groups'][group]:>12.1f}" for label in labels))
+    print(f"{'  checker modules imported':<32}" + ''.join(f"{len(results[label]['checker_modules']):>12}" for label in labels))
+    print(f"{'first dispatch (ms)':<32}")
+    # trees without a registry for a service have no dispatch timing for it
+    services = dict.fromkeys(service for label in labels for service in results[label]['dispatch_ms'])
+    for service in services:
+        print(f"{'  ' + service:<32}" + ''.join(
+            f"{results[label]['dispatch_ms'][service]:>12.1f}" if service in results[label]['dispatch_ms'] else f"{'-':>12}"
+            for label in labels
+        ))
+
+def main():
+    parser = argparse.ArgumentParser(description='Cold start import benchmark for monitor_service_quotas')
+    parser.add_argument('--lambda-dir', default=str(LAMBDA_DIR), help='Lambda source to measure')
+    parser.add_argument('--baseline-dir', help='Lambda source to compare against, e.g. a checkout of the base branch')
+    parser.add_argument('--repeat', type=int, default=5, help='fresh interpreters per tree, the median is reported')
+    parser.add_argument('--output', help='write the results as JSON')
+    args = parser.parse_args()
+
+    trees = {'current': args.lambda_dir}
+    if args.baseline_dir:
+        trees = {'baseline': args.baseline_dir, **trees}
+
+    results = {label: summarize([probe(path) for _ in range(args.repeat)]) for label, path in trees.items()}
+    print_report(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
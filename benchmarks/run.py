@@ -0,0 +1,167 @@
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import synthetic
+
+LAMBDA_DIR = Path(__file__).resolve().parent.parent / 'lambda' / 'monitor_service_quotas'
+REGION = 'us-east-1'
+
+# Runs every usage checker and the handler end to end against synthetic accounts, without network
+# access, and reports API calls, wall time and peak memory for each.
+#
+#   python benchmarks/run.py --sizes small,medium --output results.json
+#   python benchmarks/run.py --compare results.json   # exits 1 when the handler run makes more API calls
+
+def load_lambda(aws, env, lambda_dir=LAMBDA_DIR):
+    os.environ.update({
+        'AWS_DEFAULT_REGION': REGION,
+        'AWS_ACCESS_KEY_ID': 'synthetic',
+        'AWS_SECRET_ACCESS_KEY': 'synthetic',
+        'SERVICE_QUOTA_REGION_LIST': REGION,
+        'SERVICE_QUOTA_THRESHOLD': '80',
+        'SNS_TOPIC_ARN': f"arn:aws:sns:{REGION}:123456789012:synthetic",
+        'LOG_LEVEL': 'CRITICAL',
+    })
+    # nothing may leave the process
+    for name in ('SERVICE_QUOTA_STATE_URI', 'SERVICE_QUOTA_MEMBER_ROLE_NAME', 'SERVICE_QUOTA_SHARDING', 'AWS_PROFILE'):
+        os.environ.pop(name, None)
+    os.environ.update(env)
+
+    sys.path.insert(0, str(lambda_dir))
+    if importlib.util.find_spec('clients'):
+        aws.install(importlib.import_module('clients'))
+    else:
+        aws.install_boto3()
+
+    spec = importlib.util.spec_from_file_location('monitor_service_quotas', Path(lambda_dir) / 'lambda.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def _module(name):
+    # older trees (e.g. the base branch) lack some of the modules
+    return importlib.import_module(name) if importlib.util.find_spec(name) else None
+
+def reset_state():
+    # every measurement starts cold, as a new Lambda execution environment would
+    for name in ('api_cache', 'clients', 'run_cache'):
+        module = _module(name)
+        if module and hasattr(module, 'reset'):
+            module.reset()
+    for name in ('image_permissions', 'quota_catalog', 'scheduler'):
+        module = _module(name)
+        if module:
+            module._memory.clear()
+
+# service code -> per-service registry of trees from before the single registry
+LEGACY_REGISTRIES = {'elasticfilesystem': 'efs_registry'}
+
+def get_checker(module, service_code, quota_code, quota_name):
+    if hasattr(module, 'registry'):
+        return module.registry.get_checker(service_code, quota_code, quota_name)
+    registry = getattr(module, LEGACY_REGISTRIES.get(service_code, f"{service_code}_registry"), None)
+    return registry.get_checker(quota_name) if registry else None
+
+def measure(account, fn):
+    reset_state()
+    account.reset_calls()
+    result = {}
+    start = time.perf_counter()
+    try:
+        result['value'] = fn()
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"[:200]
+    result['wall_ms'] = round((time.perf_counter() - start) * 1000, 1)
+    result['calls'] = sum(account.calls.values())
+    result['operations'] = {f"{service}.{operation}": count for (service, operation), count in sorted(account.calls.items())}
+
+    # memory is measured on a second run, tracing slows everything down
+    reset_state()
+    tracemalloc.start()
+    try:
+        fn()
+    except Exception:
+        pass
+    result['peak_kib'] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+    tracemalloc.stop()
+    return result
+
+def benchmarks(module):
+    for service_code, quota_code, quota_name in synthetic.CHECKED_QUOTAS:
+        checker = get_checker(module, service_code, quota_code, quota_name)
+        if checker is None:
+            continue
+        yield f"{service_code}: {quota_name}", lambda checker=checker, quota_name=quota_name: checker.get_usage(REGION, quota_name)
+
+    yield 'handler', lambda: module.handler({}, None)
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {(item['size'], item['name']): item for item in json.load(f)}
+
+    increases = []
+    for item in results:
+        previous = baseline.get((item['size'], item['name']))
+        if previous and item['calls'] > previous['calls']:
+            increases.append((item['name'], f"{item['size']} {item['name']}: {previous['calls']} -> {item['calls']} API calls"))
+    return increases
+
+NAME_WIDTH = 72
+
+def print_header():
+    print(f"{'size':<8} {'benchmark':<{NAME_WIDTH}} {'calls':>8} {'wall ms':>10} {'peak KiB':>10}  result")
+
+def print_row(item):
+    outcome = item.get('error') or item.get('value')
+    if item['name'] == 'handler' and 'error' not in item:
+        outcome = ''
+    print(f"{item['size']:<8} {item['name']:<{NAME_WIDTH}} {item['calls']:>8} {item['wall_ms']:>10} {item['peak_kib']:>10}  {outcome}", flush=True)
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmarks for monitor_service_quotas')
+    parser.add_argument('--sizes', default='small,medium', help=f"comma separated sizes ({', '.join(synthetic.SIZES)})")
+    parser.add_argument('--only', help='only run benchmarks whose name contains this')
+    parser.add_argument('--latency-ms', type=float, default=0, help='simulated latency of every API call')
+    parser.add_argument('--env', action='append', default=[], help='extra environment for the Lambda, e.g. SERVICE_QUOTA_ENGINE=asyncio')
+    parser.add_argument('--lambda-dir', default=str(LAMBDA_DIR), help='Lambda source to benchmark, e.g. a checkout of the base branch')
+    parser.add_argument('--output', help='write the results as JSON')
+    parser.add_argument('--compare', help='JSON results of an earlier run, fail when any benchmark makes more API calls')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.CRITICAL)
+    aws = synthetic.SyntheticAWS(None)
+    module = load_lambda(aws, dict(item.split('=', 1) for item in args.env), args.lambda_dir)
+
+    print_header()
+    results = []
+    for size in args.sizes.split(','):
+        account = synthetic.SyntheticAccount(size, latency_ms=args.latency_ms)
+        aws.set_account(account)
+        for name, fn in benchmarks(module):
+            if args.only and args.only not in name:
+                continue
+            results.append({'size': size, 'name': name, **measure(account, fn)})
+            print_row(results[-1])
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, default=str)
+
+    if args.compare:
+        # a single checker may build a whole inventory the other checkers then share, only more calls
+        # for the full handler run fail the comparison
+        increases = compare(results, args.compare)
+        for name, increase in increases:
+            print(f"{'REGRESSION' if name == 'handler' else 'MORE CALLS'} {increase}")
+        if any(name == 'handler' for name, _ in increases):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,759 @@
+import boto3
+import json
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from botocore.awsrequest import AWSResponse
+
+# Resource counts of a synthetic account, per region. Sizes scale every collection together so
+# per-resource API calls (N+1 patterns) show up as call counts growing with the size.
+SIZES = {
+    'small': {
+        'services': 50,
+        'quotas_per_service': 20,
+        'volumes': 50,
+        'snapshots': 200,
+        'images': 20,
+        'instances': 50,
+        'vpcs': 5,
+        'subnets_per_vpc': 4,
+        'route_tables_per_vpc': 2,
+        'network_interfaces': 50,
+        'security_groups': 20,
+        'network_acls_per_vpc': 2,
+        'nat_gateways': 6,
+        'internet_gateways': 5,
+        'addresses': 10,
+        'transit_gateways': 1,
+        'attachments_per_transit_gateway': 5,
+        'route_tables_per_transit_gateway': 2,
+        'routes_per_transit_gateway_route_table': 20,
+        'vpcs_per_multicast_domain': 2,
+        'interfaces_per_multicast_domain': 4,
+        'client_vpn_endpoints': 2,
+        'routes_per_client_vpn_endpoint': 5,
+        'vpn_connections': 4,
+        'customer_gateways': 2,
+        'hosts': 2,
+        'reserved_instances': 3,
+        'eks_clusters': 2,
+        'nodegroups_per_cluster': 3,
+        'fargate_profiles_per_cluster': 2,
+        'db_instances': 10,
+        'db_clusters': 2,
+        'db_snapshots': 20,
+        'db_cluster_snapshots': 10,
+        'db_parameter_groups': 5,
+        'file_systems': 5,
+        'es_domains': 3,
+        'hosted_zones': 10,
+        'health_checks': 10,
+        'workspaces': 10,
+        'workspace_images': 2,
+        'stack_sets': 3,
+        'instances_per_stack_set': 5,
+        'stacks': 20,
+    }
+}
+
+def _scaled(factor, per_parent_factor):
+    # nested counts multiply with their parents, they grow slower so large accounts stay realistic
+    return {
+        name: count * (per_parent_factor if '_per_' in name else factor)
+        for name, count in SIZES['small'].items()
+    }
+
+SIZES['medium'] = _scaled(10, 2)
+SIZES['large'] = _scaled(100, 5)
+# the quota catalog does not grow with the resources
+for size in ('medium', 'large'):
+    SIZES[size].update(services=SIZES['small']['services'] * 4, quotas_per_service=SIZES['small']['quotas_per_service'])
+
+# Quotas with a custom usage check, every size includes all of them
+CHECKED_QUOTAS = [
+    ('cloudformation', 'L-31709F13', 'Stack instances per stack set'),
+    ('cloudformation', 'L-0485CB21', 'Stack count'),
+    ('ebs', 'L-B3A130E6', 'IOPS for Provisioned IOPS SSD (io1) volumes'),
+    ('ebs', 'L-C4B238BF', 'IOPS for Provisioned IOPS SSD (io2) volumes'),
+    ('ebs', 'L-309BACF6', 'Snapshots per Region'),
+    ('ebs', 'L-AFFF71FA', 'Archived snapshots per volume'),
+    ('ebs', 'L-17AF77E8', 'Storage for Cold HDD (sc1) volumes, in TiB'),
+    ('ebs', 'L-82ACEF56', 'Storage for Throughput Optimized HDD (st1) volumes, in TiB'),
+    ('ebs', 'L-D18FCD1D', 'Storage for General Purpose SSD (gp2) volumes, in TiB'),
+    ('ebs', 'L-7A658B76', 'Storage for General Purpose SSD (gp3) volumes, in TiB'),
+    ('ebs', 'L-FD252861', 'Storage for Provisioned IOPS SSD (io1) volumes, in TiB'),
+    ('ebs', 'L-09BD8365', 'Storage for Provisioned IOPS SSD (io2) volumes, in TiB'),
+    ('ebs', 'L-9CF3C2EB', 'Storage for Magnetic (standard) volumes, in TiB'),
+    ('ec2', 'L-1216C47A', 'Running On-Demand Standard (A, C, D, H, I, M, R, T, Z) instances'),
+    ('ec2', 'L-DB2E81BA', 'Running On-Demand G and VT instances'),
+    ('ec2', 'L-417A185B', 'Running On-Demand P instances'),
+    ('ec2', 'L-7295265B', 'Running On-Demand X instances'),
+    ('ec2', 'L-1945791B', 'Running On-Demand Inf instances'),
+    ('ec2', 'L-2C3B7624', 'Running On-Demand Trn instances'),
+    ('ec2', 'L-F7808C92', 'Running On-Demand High Memory instances'),
+    ('ec2', 'L-43DA4232', 'Running On-Demand HPC instances'),
+    ('ec2', 'L-34B43A08', 'All Standard (A, C, D, H, I, M, R, T, Z) Spot Instance Requests'),
+    ('ec2', 'L-3819A6DF', 'All G and VT Spot Instance Requests'),
+    ('ec2', 'L-85EED4F7', 'All DL Spot Instance Requests'),
+    ('ec2', 'L-88CF9481', 'All F Spot Instance Requests'),
+    ('ec2', 'L-7212CCBC', 'All P4, P3 and P2 Spot Instance Requests'),
+    ('ec2', 'L-C4BD4855', 'All P5 Spot Instance Requests'),
+    ('ec2', 'L-8D142A2E', 'Client VPN endpoints per Region'),
+    ('ec2', 'L-B665C33B', 'AMIs'),
+    ('ec2', 'L-A1C0A1BE', 'Multicast domain associations per VPC'),
+    ('ec2', 'L-C3F3F7F9', 'Multicast Network Interfaces per transit gateway'),
+    ('ec2', 'L-D0B7243C', 'New Reserved Instances per month'),
+    ('ec2', 'L-8B27377A', 'Running Dedicated m5 Hosts'),
+    ('ec2', 'L-E0233F82', 'Attachments per transit gateway'),
+    ('ec2', 'L-A2478D36', 'Transit gateways per account'),
+    ('ec2', 'L-3E6EC3A3', 'VPN connections per VGW'),
+    ('ec2', 'L-3E6EC3A4', 'VPN connections per region'),
+    ('ec2', 'L-E6B8F42A', 'Routes per transit gateway'),
+    ('ec2', 'L-4FB7FF5D', 'Customer gateways per region'),
+    ('ec2', 'L-0D0A6E66', 'AMI sharing'),
+    ('ec2', 'L-401D78F7', 'Routes per Client VPN endpoint'),
+    ('ec2', 'L-0263D0A3', 'EC2-VPC Elastic IPs'),
+    ('elasticfilesystem', 'L-848C634D', 'File systems per account'),
+    ('eks', 'L-1194D53C', 'Clusters'),
+    ('eks', 'L-BD136A63', 'Nodes per managed node group'),
+    ('eks', 'L-3B7DDD5A', 'Fargate profiles per cluster'),
+    ('eks', 'L-6D54EA21', 'Managed node groups per cluster'),
+    ('es', 'L-6408ABDE', 'Instances per domain'),
+    ('es', 'L-076D529E', 'Domains per region'),
+    ('rds', 'L-7ADDB58A', 'Total storage for all DB instances'),
+    ('rds', 'L-9B510759', 'Manual DB cluster snapshots'),
+    ('rds', 'L-DE55804A', 'Parameter groups'),
+    ('rds', 'L-272F1212', 'Manual DB instance snapshots'),
+    ('rds', 'L-952B80B8', 'DB clusters'),
+    ('rds', 'L-7B6409FD', 'DB Instances'),
+    ('route53', 'L-4EA4796A', 'Hosted zones'),
+    ('route53', 'L-ACB674F3', 'Health checks'),
+    ('vpc', 'L-F678F1CE', 'VPCs per Region'),
+    ('vpc', 'L-407747CB', 'Subnets per VPC'),
+    ('vpc', 'L-DF5E4CA3', 'Network interfaces per Region'),
+    ('vpc', 'L-589F43AA', 'Route tables per VPC'),
+    ('vpc', 'L-93826ACB', 'Routes per route table'),
+    ('vpc', 'L-83CA0A9D', 'IPv4 CIDR blocks per VPC'),
+    ('vpc', 'L-A4707A72', 'Internet gateways per Region'),
+    ('vpc', 'L-FE5A380F', 'NAT gateways per Availability Zone'),
+    ('vpc', 'L-B4A6D682', 'Network ACLs per VPC'),
+    ('vpc', 'L-2AEEBF1A', 'Rules per network ACL'),
+    ('vpc', 'L-E79EC296', 'VPC security groups per Region'),
+    ('vpc', 'L-0EA8095F', 'Inbound or outbound rules per security group'),
+    ('vpc', 'L-2AFB9258', 'Security groups per network interface'),
+    ('workspaces', 'L-3E1B6E4F', 'WorkSpaces'),
+    ('workspaces', 'L-54A5B4E2', 'Standby WorkSpaces'),
+    ('workspaces', 'L-34278094', 'GraphicsPro WorkSpaces'),
+    ('workspaces', 'L-2DA0E57D', 'Images'),
+]
+
+VOLUME_TYPES = ['gp2', 'gp3', 'io1', 'io2', 'st1', 'sc1', 'standard']
+# instance type: default vCPUs
+INSTANCE_TYPE_VCPUS = {
+    'm5.large': 2,
+    'c5.xlarge': 4,
+    'r5.large': 2,
+    't3.micro': 2,
+    'p3.2xlarge': 8,
+    'g4dn.xlarge': 4,
+    'x1.16xlarge': 64,
+    'inf1.xlarge': 4,
+    'trn1.2xlarge': 8,
+    'hpc6a.48xlarge': 96,
+    'u-6tb1.metal': 448,
+    'u7i-12tb.224xlarge': 896,
+    'p4d.24xlarge': 96,
+    'p5.48xlarge': 192,
+    'dl1.24xlarge': 96,
+    'f1.2xlarge': 8,
+}
+INSTANCE_TYPES = list(INSTANCE_TYPE_VCPUS)
+AVAILABILITY_ZONES = ['a', 'b', 'c']
+
+# Filters the checkers send, as a function of an item returning the values it matches on
+FILTERS = {
+    'volume-type': lambda item: [item['VolumeType']],
+    'vpc-id': lambda item: [item.get('VpcId')],
+    'transit-gateway-id': lambda item: [item.get('TransitGatewayId')],
+    'storage-tier': lambda item: [item.get('StorageTier')],
+    'instance-state-name': lambda item: [instance['State']['Name'] for instance in item['Instances']],
+    'state': lambda item: [item.get('State')],
+    'instance-type': lambda item: [item.get('HostProperties', {}).get('InstanceType', '')],
+}
+
+# Filters on a parent id are answered from an index, so the fake itself does not scale with N x M
+INDEXED_FILTERS = {
+    'vpc-id': 'VpcId',
+    'transit-gateway-id': 'TransitGatewayId',
+}
+
+def _matches(value, pattern):
+    if pattern.endswith('*'):
+        return value is not None and value.startswith(pattern[:-1])
+    return value == pattern
+
+def apply_filters(items, filters):
+    for item_filter in filters or []:
+        get_values = FILTERS.get(item_filter['Name'])
+        if get_values is None:
+            continue
+        items = [item for item in items if any(_matches(value, pattern) for value in get_values(item) for pattern in item_filter['Values'])]
+    return items
+
+# (service, operation): (collection, result key, request token, response token, page size parameter, default page size)
+# A default page size of None returns every item in one page, as EC2 does when MaxResults is not set
+LIST_OPERATIONS = {
+    ('ec2', 'DescribeVolumes'): ('volumes', 'Volumes', 'NextToken', 'NextToken', 'MaxResults', None),
+    ('ec2', 'DescribeSnapshots'): ('snapshots', 'Snapshots', 'NextToken', 'NextToken', 'MaxResults', None),
+    ('ec2', 'DescribeImages'): ('images', 'Images', 'NextToken', 'NextToken', 'MaxResults', None),
+    ('ec2', 'DescribeInstances'): ('reservations', 'Reservations', 'NextToken', 'NextToken', 'MaxResults', None),
+    ('ec2', 'DescribeVpcs'): ('vpcs', 'Vpcs', 'NextToken', 'NextToken', 'MaxResults', None),
+    ('ec2', 'DescribeSubnets'): ('subnets', 'Subnets', 'NextToken', 'NextToken', 'MaxResults', None),
+    ('ec2', 'DescribeRouteTables'): ('route_tables', 'RouteTables', 'NextToken', 'NextToken', 'MaxResults', None),
+    ('ec2', 'DescribeNetworkInterfaces'): ('network_interfaces', 'NetworkInterfaces', 'NextToken', 'NextToken', 'MaxResults', None),
+    ('ec2', 'DescribeSecurityGroups'): ('security_groups', 'SecurityGroups', 'NextToken', 'NextToken', 'MaxResults', None),
+    ('ec2', 'DescribeNetworkAcls'): ('network_acls', 'NetworkAcls', 'NextToken', 'NextToken', 'MaxResults', None),
+    ('ec2', 'DescribeNatGateways'): ('nat_gateways', 'NatGateways', 'NextToken', 'NextToken', 'MaxResults', None),
+    ('ec2', 'DescribeInternetGateways'): ('internet_gateways', 'InternetGateways', 'NextToken', 'NextToken', 'MaxResults', None),
+    ('ec2', 'DescribeAddresses'): ('addresses', 'Addresses', None, None, None, None),
+    ('ec2', 'DescribeTransitGateways'): ('transit_gateways', 'TransitGateways', 'NextToken', 'NextToken', 'MaxResults', None),
+    ('ec2', 'DescribeTransitGatewayAttachments'): ('transit_gateway_attachments', 'TransitGatewayAttachments', 'NextToken', 'NextToken', 'MaxResults', None),
+    ('ec2', 'DescribeTransitGatewayRouteTables'): ('transit_gateway_route_tables', 'TransitGatewayRouteTables', 'NextToken', 'NextToken', 'MaxResults', None),
+    ('ec2', 'DescribeTransitGatewayMulticastDomains'): ('multicast_domains', 'TransitGatewayMulticastDomains', 'NextToken', 'NextToken', 'MaxResults', None),
+    ('ec2', 'DescribeClientVpnEndpoints'): ('client_vpn_endpoints', 'ClientVpnEndpoints', 'NextToken', 'NextToken', 'MaxResults', None),
+    ('ec2', 'DescribeVpnConnections'): ('vpn_connections', 'VpnConnections', None, None, None, None),
+    ('ec2', 'DescribeCustomerGateways'): ('customer_gateways', 'CustomerGateways', None, None, None, None),
+    ('ec2', 'DescribeHosts'): ('hosts', 'Hosts', 'NextToken', 'NextToken', 'MaxResults', None),
+    ('ec2', 'DescribeReservedInstances'): ('reserved_instances', 'ReservedInstances', None, None, None, None),
+    ('eks', 'ListClusters'): ('eks_clusters', 'clusters', 'nextToken', 'nextToken', 'maxResults', 100),
+    ('rds', 'DescribeDBInstances'): ('db_instances', 'DBInstances', 'Marker', 'Marker', 'MaxRecords', 100),
+    ('rds', 'DescribeDBClusters'): ('db_clusters', 'DBClusters', 'Marker', 'Marker', 'MaxRecords', 100),
+    ('rds', 'DescribeDBSnapshots'): ('db_snapshots', 'DBSnapshots', 'Marker', 'Marker', 'MaxRecords', 100),
+    ('rds', 'DescribeDBClusterSnapshots'): ('db_cluster_snapshots', 'DBClusterSnapshots', 'Marker', 'Marker', 'MaxRecords', 100),
+    ('rds', 'DescribeDBParameterGroups'): ('db_parameter_groups', 'DBParameterGroups', 'Marker', 'Marker', 'MaxRecords', 100),
+    ('efs', 'DescribeFileSystems'): ('file_systems', 'FileSystems', 'Marker', 'NextMarker', 'MaxItems', 100),
+    ('opensearch', 'ListDomainNames'): ('es_domains', 'DomainNames', None, None, None, None),
+    ('es', 'ListDomainNames'): ('es_domains', 'DomainNames', None, None, None, None),
+    ('route53', 'ListHostedZones'): ('hosted_zones', 'HostedZones', 'Marker', 'NextMarker', 'MaxItems', 100),
+    ('route53', 'ListHealthChecks'): ('health_checks', 'HealthChecks', 'Marker', 'NextMarker', 'MaxItems', 100),
+    ('workspaces', 'DescribeWorkspaces'): ('workspaces', 'Workspaces', 'NextToken', 'NextToken', 'Limit', 25),
+    ('workspaces', 'DescribeWorkspaceImages'): ('workspace_images', 'Images', 'NextToken', 'NextToken', 'MaxResults', 25),
+    ('cloudformation', 'ListStacks'): ('stacks', 'StackSummaries', 'NextToken', 'NextToken', None, 100),
+    ('cloudformation', 'ListStackSets'): ('stack_sets', 'Summaries', 'NextToken', 'NextToken', 'MaxResults', 100),
+    ('service-quotas', 'ListServices'): ('quota_services', 'Services', 'NextToken', 'NextToken', 'MaxResults', 100),
+}
+
+# Generates the resources of one account and answers API calls about them
+class SyntheticAccount:
+    def __init__(self, size='small', account_id='123456789012', latency_ms=0):
+        self.counts = dict(SIZES[size]) if isinstance(size, str) else dict(size)
+        self.account_id = account_id
+        self.latency = latency_ms / 1000
+        self.calls = Counter()
+        self._collections = {}
+        self._lock = threading.RLock()
+
+    def count(self, name):
+        return self.counts.get(name, 0)
+
+    def collection(self, name):
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = getattr(self, f"_build_{name}")()
+            return self._collections[name]
+
+    def reset_calls(self):
+        with self._lock:
+            self.calls.clear()
+
+    def respond(self, service_name, operation_name, params):
+        with self._lock:
+            self.calls[(service_name, operation_name)] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        custom = getattr(self, f"_op_{service_name.replace('-', '_')}_{operation_name}", None)
+        if custom:
+            return custom(params)
+        if (service_name, operation_name) in LIST_OPERATIONS:
+            return self._list(LIST_OPERATIONS[(service_name, operation_name)], params)
+        raise NotImplementedError(f"Synthetic account does not implement {service_name}.{operation_name}")
+
+    def _list(self, operation, params):
+        collection, result_key, token_in, token_out, page_size_name, default_page_size = operation
+        items = self.collection(collection)
+        filters = params.get('Filters') or []
+        for item_filter in filters:
+            if item_filter['Name'] in INDEXED_FILTERS and len(item_filter['Values']) == 1:
+                items = self._children(collection, INDEXED_FILTERS[item_filter['Name']], item_filter['Values'][0])
+                filters = [other for other in filters if other is not item_filter]
+                break
+        items = apply_filters(items, filters)
+        # route53 sends its page size as a string
+        page_size = int(params.get(page_size_name) or default_page_size or len(items) or 1)
+        start = int(params.get(token_in) or 0) if token_in else 0
+        end = start + page_size
+
+        response = {result_key: items[start:end]}
+        if token_out and end < len(items):
+            response[token_out] = str(end)
+            if token_out == 'NextMarker':
+                response['IsTruncated'] = True
+        elif token_out == 'NextMarker':
+            response['IsTruncated'] = False
+        return response
+
+    def _children(self, collection, parent_key, parent_id):
+        index_name = f"{collection}_by_{parent_key}"
+        with self._lock:
+            if index_name not in self._collections:
+                index = {}
+                for item in self.collection(collection):
+                    index.setdefault(item[parent_key], []).append(item)
+                self._collections[index_name] = index
+        return self._collections[index_name].get(parent_id, [])
+
+    # custom operations
+    def _op_ec2_DescribeImageAttribute(self, params):
+        index = int(params['ImageId'].rsplit('-', 1)[1], 16)
+        permissions = [{'UserId': '210987654321'}] if index % 4 == 0 else []
+        return {'ImageId': params['ImageId'], 'LaunchPermissions': permissions}
+
+    def _op_ec2_DescribeInstanceTypes(self, params):
+        return {'InstanceTypes': [
+            {'InstanceType': instance_type, 'VCpuInfo': {'DefaultVCpus': INSTANCE_TYPE_VCPUS[instance_type]}}
+            for instance_type in params.get('InstanceTypes', INSTANCE_TYPE_VCPUS)
+        ]}
+
+    def _op_ec2_DescribeClientVpnRoutes(self, params):
+        return {'Routes': [
+            {'ClientVpnEndpointId': params['ClientVpnEndpointId'], 'DestinationCidr': f"10.{i // 256}.{i % 256}.0/24"}
+            for i in range(self.count('routes_per_client_vpn_endpoint'))
+        ]}
+
+    def _op_ec2_SearchTransitGatewayRoutes(self, params):
+        routes = self._children('transit_gateway_routes', 'TransitGatewayRouteTableId', params['TransitGatewayRouteTableId'])
+        max_results = params.get('MaxResults') or 1000
+        return {'Routes': routes[:max_results], 'AdditionalRoutesAvailable': len(routes) > max_results}
+
+    def _op_ec2_GetTransitGatewayMulticastDomainAssociations(self, params):
+        domain_id = params['TransitGatewayMulticastDomainId']
+        return {'MulticastDomainAssociations': self._children('multicast_domain_associations', 'TransitGatewayMulticastDomainId', domain_id)}
+
+    def _op_ec2_SearchTransitGatewayMulticastGroups(self, params):
+        return {'MulticastGroups': self._children('multicast_groups', 'TransitGatewayMulticastDomainId', params['TransitGatewayMulticastDomainId'])}
+
+    def _op_eks_ListNodegroups(self, params):
+        nodegroups = [nodegroup['nodegroupName'] for nodegroup in self._children('nodegroups', 'clusterName', params['clusterName'])]
+        return {'nodegroups': nodegroups}
+
+    def _op_eks_DescribeNodegroup(self, params):
+        nodegroup = next(nodegroup for nodegroup in self._children('nodegroups', 'clusterName', params['clusterName']) if nodegroup['nodegroupName'] == params['nodegroupName'])
+        return {'nodegroup': nodegroup}
+
+    def _op_eks_ListFargateProfiles(self, params):
+        return {'fargateProfileNames': [f"{params['clusterName']}-profile-{i}" for i in range(self.count('fargate_profiles_per_cluster'))]}
+
+    # legacy Elasticsearch API, still used by older trees
+    def _op_es_DescribeElasticsearchDomainConfig(self, params):
+        domain = next(domain for domain in self.collection('es_domains') if domain['DomainName'] == params['DomainName'])
+        return {'DomainConfig': {'ElasticsearchClusterConfig': {'Options': domain['ClusterConfig'], 'Status': {'State': 'Active'}}}}
+
+    def _op_opensearch_DescribeDomains(self, params):
+        if len(params['DomainNames']) > 5:
+            raise ValueError('DescribeDomains accepts at most 5 domain names')
+        domains = {domain['DomainName']: domain for domain in self.collection('es_domains')}
+        return {'DomainStatusList': [domains[name] for name in params['DomainNames'] if name in domains]}
+
+    def _op_cloudformation_ListStackInstances(self, params):
+        return {'Summaries': [
+            {'StackSetId': params['StackSetName'], 'Account': self.account_id, 'Region': f"region-{i}"}
+            for i in range(self.count('instances_per_stack_set'))
+        ]}
+
+    def _op_service_quotas_ListServiceQuotas(self, params):
+        quotas = [quota for quota in self.collection('quotas') if quota['ServiceCode'] == params['ServiceCode']]
+        start = int(params.get('NextToken') or 0)
+        end = start + (params.get('MaxResults') or 100)
+        response = {'Quotas': quotas[start:end]}
+        if end < len(quotas):
+            response['NextToken'] = str(end)
+        return response
+
+    def _op_service_quotas_GetServiceQuota(self, params):
+        quota = next(quota for quota in self.collection('quotas') if quota['ServiceCode'] == params['ServiceCode'] and quota['QuotaCode'] == params['QuotaCode'])
+        return {'Quota': quota}
+
+    def _op_cloudwatch_GetMetricData(self, params):
+        timestamp = datetime.now(timezone.utc)
+        return {'MetricDataResults': [
+            # every fifth metric is close to its limit
+            {'Id': query['Id'], 'Label': query['Id'], 'Timestamps': [timestamp], 'Values': [90.0 if int(query['Id'][1:]) % 5 == 0 else 10.0], 'StatusCode': 'Complete'}
+            for query in params['MetricDataQueries']
+        ]}
+
+    # one metric per call, used by older trees
+    def _op_cloudwatch_GetMetricStatistics(self, params):
+        return {'Label': params['MetricName'], 'Datapoints': [{'Timestamp': datetime.now(timezone.utc), 'Maximum': 10.0, 'Unit': 'Count'}]}
+
+    def _op_sns_Publish(self, params):
+        return {'MessageId': 'synthetic'}
+
+    def _op_sts_GetCallerIdentity(self, params):
+        return {'Account': self.account_id, 'Arn': f"arn:aws:iam::{self.account_id}:role/synthetic", 'UserId': 'synthetic'}
+
+    # collections
+    def _build_quota_services(self):
+        checked = sorted({service_code for service_code, _, _ in CHECKED_QUOTAS})
+        extra = [f"synthetic-{i:03d}" for i in range(max(0, self.count('services') - len(checked)))]
+        return [{'ServiceCode': service_code, 'ServiceName': service_code.upper()} for service_code in checked + extra]
+
+    def _build_quotas(self):
+        quotas = []
+        for service_code, quota_code, quota_name in CHECKED_QUOTAS:
+            quotas.append(self._quota(service_code, quota_code, quota_name, 100000.0))
+
+        for service in self.collection('quota_services'):
+            for i in range(self.count('quotas_per_service')):
+                quota = self._quota(service['ServiceCode'], f"L-{service['ServiceCode'][:3].upper()}{i:05d}", f"Synthetic quota {i}", 100.0)
+                # a third of the quotas publish a usage metric, the rest have no usage source
+                if i % 3 == 0:
+                    quota['UsageMetric'] = {
+                        'MetricNamespace': 'AWS/Usage',
+                        'MetricName': 'ResourceCount',
+                        'MetricDimensions': {'Service': service['ServiceCode'], 'Resource': f"resource-{i}", 'Type': 'Resource', 'Class': 'None'},
+                        'MetricStatisticRecommendation': 'Maximum'
+                    }
+                quotas.append(quota)
+        return quotas
+
+    def _quota(self, service_code, quota_code, quota_name, value):
+        return {
+            'ServiceCode': service_code,
+            'ServiceName': service_code.upper(),
+            'QuotaArn': f"arn:aws:servicequotas:us-east-1:{self.account_id}:{service_code}/{quota_code}",
+            'QuotaCode': quota_code,
+            'QuotaName': quota_name,
+            'Value': value,
+            'Unit': 'None',
+            'Adjustable': True,
+            'GlobalQuota': False
+        }
+
+    def _build_volumes(self):
+        volumes = []
+        for i in range(self.count('volumes')):
+            volume_type = VOLUME_TYPES[i % len(VOLUME_TYPES)]
+            volumes.append({
+                'VolumeId': f"vol-{i:017x}",
+                'VolumeType': volume_type,
+                'Size': 100 + i % 900,
+                'Iops': 3000 + i % 1000 if volume_type in ('gp3', 'io1', 'io2') else 300,
+                'State': 'in-use',
+                'AvailabilityZone': f"us-east-1{AVAILABILITY_ZONES[i % 3]}",
+                'CreateTime': datetime(2024, 1, 1, tzinfo=timezone.utc)
+            })
+        return volumes
+
+    def _build_snapshots(self):
+        volume_count = max(1, self.count('volumes'))
+        return [{
+            'SnapshotId': f"snap-{i:017x}",
+            'VolumeId': f"vol-{i % volume_count:017x}",
+            'VolumeSize': 100,
+            'OwnerId': self.account_id,
+            'State': 'completed',
+            'StorageTier': 'archive' if i % 10 == 0 else 'standard',
+            'StartTime': datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(hours=i)
+        } for i in range(self.count('snapshots'))]
+
+    def _build_images(self):
+        return [{
+            'ImageId': f"ami-{i:017x}",
+            'OwnerId': self.account_id,
+            'State': 'available',
+            'Public': False,
+            'CreationDate': '2024-01-01T00:00:00.000Z'
+        } for i in range(self.count('images'))]
+
+    def _build_reservations(self):
+        return [{
+            'ReservationId': f"r-{i:017x}",
+            'OwnerId': self.account_id,
+            'Instances': [{
+                'InstanceId': f"i-{i:017x}",
+                'InstanceType': INSTANCE_TYPES[i % len(INSTANCE_TYPES)],
+                'State': {'Code': 16, 'Name': 'running' if i % 7 else 'stopped'},
+                'InstanceLifecycle': 'spot' if i % 11 == 0 else None,
+                'Placement': {'AvailabilityZone': f"us-east-1{AVAILABILITY_ZONES[i % 3]}", 'Tenancy': 'default'},
+                'CpuOptions': {'CoreCount': 2, 'ThreadsPerCore': 2}
+            }]
+        } for i in range(self.count('instances'))]
+
+    def _build_vpcs(self):
+        return [{'VpcId': f"vpc-{i:017x}", 'CidrBlock': f"10.{i % 256}.0.0/16", 'State': 'available', 'IsDefault': i == 0} for i in range(self.count('vpcs'))]
+
+    def _build_subnets(self):
+        return [{
+            'SubnetId': f"subnet-{vpc_index:08x}{i:09x}",
+            'VpcId': vpc['VpcId'],
+            'AvailabilityZone': f"us-east-1{AVAILABILITY_ZONES[i % 3]}",
+            'CidrBlock': f"10.{vpc_index % 256}.{i % 256}.0/24"
+        } for vpc_index, vpc in enumerate(self.collection('vpcs')) for i in range(self.count('subnets_per_vpc'))]
+
+    def _build_route_tables(self):
+        return [{
+            'RouteTableId': f"rtb-{vpc_index:08x}{i:09x}",
+            'VpcId': vpc['VpcId'],
+            'Routes': [{'DestinationCidrBlock': vpc['CidrBlock'], 'GatewayId': 'local'}],
+            'Associations': []
+        } for vpc_index, vpc in enumerate(self.collection('vpcs')) for i in range(self.count('route_tables_per_vpc'))]
+
+    def _build_network_interfaces(self):
+        subnets = self.collection('subnets') or [{'SubnetId': None, 'VpcId': None, 'AvailabilityZone': 'us-east-1a'}]
+        return [{
+            'NetworkInterfaceId': f"eni-{i:017x}",
+            'SubnetId': subnets[i % len(subnets)]['SubnetId'],
+            'VpcId': subnets[i % len(subnets)]['VpcId'],
+            'AvailabilityZone': subnets[i % len(subnets)]['AvailabilityZone'],
+            'InterfaceType': 'interface',
+            'Status': 'in-use',
+            'Groups': [{'GroupId': f"sg-{j:017x}"} for j in range(1 + i % 3)]
+        } for i in range(self.count('network_interfaces'))]
+
+    def _build_security_groups(self):
+        vpcs = self.collection('vpcs') or [{'VpcId': None}]
+        return [{
+            'GroupId': f"sg-{i:017x}",
+            'VpcId': vpcs[i % len(vpcs)]['VpcId'],
+            'IpPermissions': [{'IpProtocol': 'tcp', 'FromPort': 443, 'ToPort': 443, 'IpRanges': [{'CidrIp': f"10.{j}.0.0/16"} for j in range(1 + i % 10)]}],
+            'IpPermissionsEgress': [{'IpProtocol': '-1', 'IpRanges': [{'CidrIp': '0.0.0.0/0'}], 'Ipv6Ranges': [{'CidrIpv6': '::/0'}]}]
+        } for i in range(self.count('security_groups'))]
+
+    def _build_network_acls(self):
+        return [{
+            'NetworkAclId': f"acl-{vpc_index:08x}{i:09x}",
+            'VpcId': vpc['VpcId'],
+            'IsDefault': i == 0,
+            'Entries': [
+                {'RuleNumber': rule_number, 'Egress': egress, 'RuleAction': 'allow', 'CidrBlock': '0.0.0.0/0'}
+                for egress in (False, True) for rule_number in [100 * (j + 1) for j in range(1 + i % 4)] + [32767]
+            ] + [
+                # every other network ACL is dual stack, with IPv6 rules and their own default rule
+                {'RuleNumber': rule_number, 'Egress': egress, 'RuleAction': 'allow', 'Ipv6CidrBlock': '::/0'}
+                for egress in (False, True) for rule_number in [100 * (j + 1) + 1 for j in range(1 + i % 4)] + [32768]
+                if i % 2
+            ]
+        } for vpc_index, vpc in enumerate(self.collection('vpcs')) for i in range(self.count('network_acls_per_vpc'))]
+
+    def _build_nat_gateways(self):
+        subnets = self.collection('subnets') or [{'SubnetId': None, 'VpcId': None}]
+        return [{
+            'NatGatewayId': f"nat-{i:017x}",
+            'SubnetId': subnets[i % len(subnets)]['SubnetId'],
+            'VpcId': subnets[i % len(subnets)]['VpcId'],
+            'State': 'available' if i % 5 else 'deleted'
+        } for i in range(self.count('nat_gateways'))]
+
+    def _build_internet_gateways(self):
+        vpcs = self.collection('vpcs')
+        return [{
+            'InternetGatewayId': f"igw-{i:017x}",
+            'Attachments': [{'VpcId': vpcs[i]['VpcId'], 'State': 'available'}] if i < len(vpcs) else []
+        } for i in range(self.count('internet_gateways'))]
+
+    def _build_addresses(self):
+        return [{'AllocationId': f"eipalloc-{i:017x}", 'PublicIp': f"198.51.{i // 256 % 256}.{i % 256}", 'Domain': 'vpc'} for i in range(self.count('addresses'))]
+
+    def _build_transit_gateways(self):
+        return [{'TransitGatewayId': f"tgw-{i:017x}", 'State': 'available', 'OwnerId': self.account_id} for i in range(self.count('transit_gateways'))]
+
+    def _build_transit_gateway_attachments(self):
+        return [{
+            'TransitGatewayAttachmentId': f"tgw-attach-{tgw_index:08x}{i:09x}",
+            'TransitGatewayId': tgw['TransitGatewayId'],
+            'ResourceType': 'vpc',
+            'State': 'available'
+        } for tgw_index, tgw in enumerate(self.collection('transit_gateways')) for i in range(self.count('attachments_per_transit_gateway'))]
+
+    def _build_transit_gateway_route_tables(self):
+        return [{
+            'TransitGatewayRouteTableId': f"tgw-rtb-{tgw_index:08x}{i:09x}",
+            'TransitGatewayId': tgw['TransitGatewayId'],
+            'State': 'available'
+        } for tgw_index, tgw in enumerate(self.collection('transit_gateways')) for i in range(self.count('route_tables_per_transit_gateway'))]
+
+    def _build_transit_gateway_routes(self):
+        return [{
+            'TransitGatewayRouteTableId': route_table['TransitGatewayRouteTableId'],
+            'DestinationCidrBlock': f"10.{i // 256 % 256}.{i % 256}.0/24",
+            'Type': 'propagated',
+            'State': 'active'
+        } for route_table in self.collection('transit_gateway_route_tables') for i in range(self.count('routes_per_transit_gateway_route_table'))]
+
+    def _build_multicast_domains(self):
+        return [{
+            'TransitGatewayMulticastDomainId': f"tgw-mcast-domain-{i:017x}",
+            'TransitGatewayId': tgw['TransitGatewayId'],
+            'State': 'available'
+        } for i, tgw in enumerate(self.collection('transit_gateways'))]
+
+    def _build_multicast_domain_associations(self):
+        vpcs = self.collection('vpcs') or [{'VpcId': None}]
+        return [{
+            'TransitGatewayMulticastDomainId': domain['TransitGatewayMulticastDomainId'],
+            'TransitGatewayAttachmentId': f"tgw-attach-{domain_index:08x}{i:09x}",
+            'ResourceId': vpcs[(domain_index + i) % len(vpcs)]['VpcId'],
+            'ResourceType': 'vpc',
+            'Subnet': {'SubnetId': f"subnet-{domain_index:08x}{i:09x}", 'State': 'associated'}
+        } for domain_index, domain in enumerate(self.collection('multicast_domains')) for i in range(self.count('vpcs_per_multicast_domain'))]
+
+    def _build_multicast_groups(self):
+        return [{
+            'TransitGatewayMulticastDomainId': domain['TransitGatewayMulticastDomainId'],
+            'GroupIpAddress': f"224.0.0.{i % 2 + 1}",
+            'NetworkInterfaceId': f"eni-{domain_index:08x}{i:09x}",
+            'GroupMember': i % 2 == 0,
+            'GroupSource': i % 2 == 1
+        } for domain_index, domain in enumerate(self.collection('multicast_domains')) for i in range(self.count('interfaces_per_multicast_domain'))]
+
+    def _build_client_vpn_endpoints(self):
+        return [{'ClientVpnEndpointId': f"cvpn-endpoint-{i:017x}", 'Status': {'Code': 'available'}} for i in range(self.count('client_vpn_endpoints'))]
+
+    def _build_vpn_connections(self):
+        return [{'VpnConnectionId': f"vpn-{i:017x}", 'VpnGatewayId': f"vgw-{i % 3:017x}", 'State': 'available'} for i in range(self.count('vpn_connections'))]
+
+    def _build_customer_gateways(self):
+        return [{'CustomerGatewayId': f"cgw-{i:017x}", 'State': 'available'} for i in range(self.count('customer_gateways'))]
+
+    def _build_hosts(self):
+        return [{'HostId': f"h-{i:017x}", 'State': 'available', 'HostProperties': {'InstanceType': 'm5.large', 'InstanceFamily': 'm5'}} for i in range(self.count('hosts'))]
+
+    def _build_reserved_instances(self):
+        start = datetime.now(timezone.utc).replace(day=1, hour=1)
+        return [{'ReservedInstancesId': f"ri-{i:08x}", 'InstanceCount': 1, 'State': 'active', 'Start': start} for i in range(self.count('reserved_instances'))]
+
+    def _build_eks_clusters(self):
+        return [f"cluster-{i}" for i in range(self.count('eks_clusters'))]
+
+    def _build_nodegroups(self):
+        return [{
+            'clusterName': cluster_name,
+            'nodegroupName': f"{cluster_name}-nodegroup-{i}",
+            'scalingConfig': {'minSize': 1, 'maxSize': 3 + i % 20, 'desiredSize': 2},
+            'status': 'ACTIVE'
+        } for cluster_name in self.collection('eks_clusters') for i in range(self.count('nodegroups_per_cluster'))]
+
+    def _build_db_instances(self):
+        return [{'DBInstanceIdentifier': f"db-{i}", 'Engine': 'postgres', 'AllocatedStorage': 100 + i % 500, 'DBInstanceStatus': 'available'} for i in range(self.count('db_instances'))]
+
+    def _build_db_clusters(self):
+        return [{'DBClusterIdentifier': f"cluster-{i}", 'Engine': 'aurora-postgresql', 'Status': 'available'} for i in range(self.count('db_clusters'))]
+
+    def _build_db_snapshots(self):
+        return [{'DBSnapshotIdentifier': f"db-snapshot-{i}", 'SnapshotType': 'manual', 'Status': 'available'} for i in range(self.count('db_snapshots'))]
+
+    def _build_db_cluster_snapshots(self):
+        return [{'DBClusterSnapshotIdentifier': f"cluster-snapshot-{i}", 'SnapshotType': 'manual', 'Status': 'available'} for i in range(self.count('db_cluster_snapshots'))]
+
+    def _build_db_parameter_groups(self):
+        return [{'DBParameterGroupName': f"params-{i}", 'DBParameterGroupFamily': 'postgres16'} for i in range(self.count('db_parameter_groups'))]
+
+    def _build_file_systems(self):
+        return [{'FileSystemId': f"fs-{i:08x}", 'LifeCycleState': 'available', 'OwnerId': self.account_id} for i in range(self.count('file_systems'))]
+
+    def _build_es_domains(self):
+        return [{
+            'DomainName': f"domain-{i}",
+            'EngineType': 'OpenSearch',
+            'ClusterConfig': {
+                'InstanceType': 'r6g.large.search',
+                'InstanceCount': 3 + i % 10,
+                'DedicatedMasterEnabled': True,
+                'DedicatedMasterCount': 3,
+                'WarmEnabled': i % 2 == 0,
+                'WarmCount': 2
+            }
+        } for i in range(self.count('es_domains'))]
+
+    def _build_hosted_zones(self):
+        return [{'Id': f"/hostedzone/Z{i:012d}", 'Name': f"zone{i}.example.com.", 'CallerReference': str(i)} for i in range(self.count('hosted_zones'))]
+
+    def _build_health_checks(self):
+        return [{'Id': f"hc-{i}", 'CallerReference': str(i), 'HealthCheckConfig': {'Type': 'HTTPS'}, 'HealthCheckVersion': 1} for i in range(self.count('health_checks'))]
+
+    def _build_workspaces(self):
+        compute_types = ['STANDARD', 'PERFORMANCE', 'GRAPHICS_PRO']
+        return [{
+            'WorkspaceId': f"ws-{i:09x}",
+            'State': 'STOPPED' if i % 4 == 0 else 'AVAILABLE',
+            'WorkspaceProperties': {'ComputeTypeName': compute_types[i % len(compute_types)]}
+        } for i in range(self.count('workspaces'))]
+
+    def _build_workspace_images(self):
+        return [{'ImageId': f"wsi-{i:09x}", 'OwnerAccountId': self.account_id, 'State': 'AVAILABLE'} for i in range(self.count('workspace_images'))]
+
+    def _build_stack_sets(self):
+        return [{'StackSetName': f"stack-set-{i}", 'Status': 'ACTIVE'} for i in range(self.count('stack_sets'))]
+
+    def _build_stacks(self):
+        return [{'StackName': f"stack-{i}", 'StackStatus': 'CREATE_COMPLETE', 'CreationTime': datetime(2024, 1, 1, tzinfo=timezone.utc)} for i in range(self.count('stacks'))]
+
+# Serves every client created through clients.create_client from a synthetic account. Handlers are
+# registered after the ones the clients module attaches, so API cache hits never reach the account
+# and the call counts are the calls that would have gone to AWS.
+# raw body of a synthetic response, sized like the JSON of the parsed response
+class SyntheticBody:
+    def __init__(self, content):
+        self.content = content
+
+    def stream(self, **kwargs):
+        yield self.content
+
+class SyntheticAWS:
+    def __init__(self, account):
+        self.account = account
+        self._original_create_client = None
+
+    def attach(self, client):
+        service_name = client.meta.service_model.service_name
+
+        def before_parameter_build(params, context, **kwargs):
+            context['synthetic_params'] = dict(params)
+
+        def before_call(model, context, **kwargs):
+            parsed = self.account.respond(service_name, model.name, context.get('synthetic_params', {}))
+            parsed.setdefault('ResponseMetadata', {'HTTPStatusCode': 200, 'RetryAttempts': 0})
+            body = json.dumps(parsed, default=str).encode()
+            return AWSResponse(client.meta.endpoint_url, 200, {}, SyntheticBody(body)), parsed
+
+        client.meta.events.register('before-parameter-build', before_parameter_build)
+        client.meta.events.register_last('before-call', before_call)
+        return client
+
+    def install(self, clients_module):
+        self._original_create_client = clients_module.create_client
+
+        def create_client(*args, **kwargs):
+            return self.attach(self._original_create_client(*args, **kwargs))
+
+        clients_module.create_client = create_client
+        return self
+
+    def uninstall(self, clients_module):
+        clients_module.create_client = self._original_create_client
+
+    # Older trees (e.g. the base branch) have no clients module and create their clients with
+    # boto3.client directly, every boto3 client is served instead
+    def install_boto3(self):
+        original_client = boto3.session.Session.client
+
+        def client(session, *args, **kwargs):
+            return self.attach(original_client(session, *args, **kwargs))
+
+        boto3.session.Session.client = client
+        return self
+
+    def set_account(self, account):
+        self.account = account
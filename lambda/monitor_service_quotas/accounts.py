@@ -0,0 +1,54 @@
+import clients
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+# assumed role sessions are refreshed this long before their credentials expire
+SESSION_REFRESH_MARGIN = timedelta(minutes=5)
+
+_sessions = {}
+_session_locks = {}
+_sessions_lock = threading.Lock()
+
+def list_member_accounts():
+    organizations = clients.get_client('organizations', None)
+    accounts = []
+    paginator = organizations.get_paginator('list_accounts')
+    for page in paginator.paginate():
+        accounts.extend(account for account in page['Accounts'] if account['Status'] == 'ACTIVE')
+    return accounts
+
+def caller_identity():
+    identity = clients.get_client('sts', None).get_caller_identity()
+    return identity['Account'], identity['Arn'].split(':')[1]
+
+def get_session(account_id, role_name, partition='aws'):
+    key = (account_id, role_name)
+    with _sessions_lock:
+        lock = _session_locks.setdefault(key, threading.Lock())
+
+    # one assume_role per account even when several regions of it start at once
+    with lock:
+        cached = _sessions.get(key)
+        if cached and cached[1] - SESSION_REFRESH_MARGIN > datetime.now(timezone.utc):
+            return cached[0]
+
+        response = clients.get_client('sts', None).assume_role(
+            RoleArn=f"arn:{partition}:iam::{account_id}:role/{role_name}",
+            RoleSessionName='monitor_service_quotas'
+        )
+        credentials = response['Credentials']
+        session = clients.new_session(
+            aws_access_key_id=credentials['AccessKeyId'],
+            aws_secret_access_key=credentials['SecretAccessKey'],
+            aws_session_token=credentials['SessionToken']
+        )
+        _sessions[key] = (session, credentials['Expiration'])
+        return session
+
+def release_session(account_id, role_name):
+    with _sessions_lock:
+        _sessions.pop((account_id, role_name), None)
+        _session_locks.pop((account_id, role_name), None)
@@ -0,0 +1,162 @@
+import copy
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# only read operations are memoized
+CACHEABLE_PREFIXES = ('Describe', 'Get', 'List', 'Search')
+# Listings streamed once per run into run-wide aggregates (the vCPU scan, the snapshot scanner, the
+# VPC inventory), caching their pages would hold every such resource of the account in memory
+UNCACHEABLE_OPERATIONS = {
+    'GetMetricData',
+    'GetMetricStatistics',
+    'DescribeInstances',
+    'DescribeSnapshots',
+    'DescribeDBSnapshots',
+    'DescribeDBClusterSnapshots',
+    'DescribeVpcs',
+    'DescribeSubnets',
+    'DescribeRouteTables',
+    'DescribeNetworkInterfaces',
+    'DescribeSecurityGroups',
+    'DescribeNetworkAcls',
+    'DescribeNatGateways',
+    'DescribeInternetGateways',
+}
+
+# Memoizes API responses for the duration of one run, keyed by (region, service, operation, params).
+#
+# Hooks into the botocore event system so direct calls and paginators are both covered. When several
+# threads make the same call at once only the first one reaches AWS, the others wait for its response.
+#
+# The cache is bounded both by entries and by the size of the raw responses, a response bigger than
+# an eighth of max_bytes is never cached so one large listing can't flush everything else.
+class ApiCache:
+    def __init__(self, max_entries=256, max_bytes=16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'collapsed': 0, 'evictions': 0, 'oversized': 0}
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._stats = {key: 0 for key in self._stats}
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._entries), bytes=self._bytes)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0
+        return stats
+
+    def lookup(self, key):
+        while True:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    http_response, parsed, _ = self._entries[key]
+                    return http_response, copy.deepcopy(parsed)
+
+                event = self._inflight.get(key)
+                if event is None:
+                    self._inflight[key] = threading.Event()
+                    self._stats['misses'] += 1
+                    return None
+
+                self._stats['collapsed'] += 1
+
+            # another thread is making the same call, use its response once it lands
+            event.wait()
+
+    def store(self, key, http_response, parsed):
+        size = len(http_response.content or b'')
+        with self._lock:
+            if size > self.max_bytes // 8:
+                self._stats['oversized'] += 1
+                return
+            previous = self._entries.pop(key, None)
+            if previous:
+                self._bytes -= previous[2]
+            self._entries[key] = (http_response, copy.deepcopy(parsed), size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._stats['evictions'] += 1
+
+    def release_scope(self, scope):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == scope]:
+                self._bytes -= self._entries.pop(key)[2]
+
+    def release(self, key):
+        with self._lock:
+            event = self._inflight.pop(key, None)
+        if event:
+            event.set()
+
+    def attach(self, client, scope=None):
+        region = client.meta.region_name
+        service_name = client.meta.service_model.service_name
+
+        def before_parameter_build(params, model, context, **kwargs):
+            # streamed bodies (e.g. S3 GetObject) can only be read once
+            if model.name.startswith(CACHEABLE_PREFIXES) and model.name not in UNCACHEABLE_OPERATIONS and not model.has_streaming_output:
+                context['api_cache_key'] = (scope, region, service_name, model.name, json.dumps(params, sort_keys=True, default=str))
+
+        def before_call(context, **kwargs):
+            key = context.get('api_cache_key')
+            if key is None:
+                return None
+
+            response = self.lookup(key)
+            if response is None:
+                context['api_cache_leader'] = True
+            return response
+
+        def after_call(http_response, parsed, context, **kwargs):
+            if context.pop('api_cache_leader', False):
+                key = context['api_cache_key']
+                try:
+                    # errors are never cached, the next caller retries the call itself
+                    if http_response.status_code < 300:
+                        self.store(key, http_response, parsed)
+                finally:
+                    self.release(key)
+
+        def after_call_error(context, **kwargs):
+            if context.pop('api_cache_leader', False):
+                self.release(context['api_cache_key'])
+
+        client.meta.events.register('before-parameter-build', before_parameter_build)
+        client.meta.events.register('before-call', before_call)
+        client.meta.events.register('after-call', after_call)
+        client.meta.events.register('after-call-error', after_call_error)
+        return client
+
+_cache = ApiCache(
+    int(os.environ.get('SERVICE_QUOTA_API_CACHE_MAX_ENTRIES', 256)),
+    int(os.environ.get('SERVICE_QUOTA_API_CACHE_MAX_MB', 16)) * 1024 * 1024
+)
+
+def attach(client, scope=None):
+    return _cache.attach(client, scope)
+
+def reset():
+    _cache.reset()
+
+def release_scope(scope):
+    _cache.release_scope(scope)
+
+def stats():
+    return _cache.stats()
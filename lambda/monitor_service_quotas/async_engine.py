@@ -0,0 +1,113 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import reducers
+import threading
+import weakref
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Maximum in-flight API calls per service, overridable with SERVICE_QUOTA_ASYNC_CONCURRENCY
+# (e.g. "ec2=50,eks=20"). The rate limiter still paces the calls themselves.
+DEFAULT_CONCURRENCY = {
+    'ec2': 32,
+    'eks': 16,
+    'es': 8,
+    'opensearch': 8,
+    'rds': 16,
+}
+DEFAULT_SERVICE_CONCURRENCY = 8
+
+# boto3 has no native asyncio support in the Lambda runtime, calls run on this many threads while the
+# event loop only waits on them
+MAX_WORKERS = int(os.environ.get('SERVICE_QUOTA_ASYNC_MAX_WORKERS', 128))
+
+def parse_concurrency(value):
+    limits = {}
+    for item in filter(None, (part.strip() for part in (value or '').split(','))):
+        service, _, limit = item.partition('=')
+        limits[service.strip()] = int(limit)
+    return limits
+
+def concurrency_limits():
+    return {**DEFAULT_CONCURRENCY, **parse_concurrency(os.environ.get('SERVICE_QUOTA_ASYNC_CONCURRENCY'))}
+
+class AsyncEngine:
+    def __init__(self, concurrency=None, max_workers=MAX_WORKERS):
+        self.concurrency = {**DEFAULT_CONCURRENCY, **(concurrency or {})}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='async-engine')
+        # asyncio semaphores belong to one event loop, every region thread runs its own
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def _semaphore(self, service_name):
+        semaphores = self._semaphores.setdefault(asyncio.get_running_loop(), {})
+        if service_name not in semaphores:
+            semaphores[service_name] = asyncio.Semaphore(self.concurrency.get(service_name, DEFAULT_SERVICE_CONCURRENCY))
+        return semaphores[service_name]
+
+    async def call(self, service_name, fn, *args, **kwargs):
+        async with self._semaphore(service_name):
+            # the account scope of the caller is carried into the worker thread
+            context = contextvars.copy_context()
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor,
+                functools.partial(context.run, fn, *args, **kwargs)
+            )
+
+    def client(self, client):
+        return AsyncClient(self, client)
+
+    async def get_usage(self, checker, region, quota_name):
+        if isinstance(checker, AsyncUsageChecker):
+            return await checker.get_usage_async(self, region, quota_name)
+        # existing checkers run unchanged on a worker thread
+        return await self.call(f"checker:{type(checker).__name__}", checker.get_usage, region, quota_name)
+
+    def run(self, coroutine):
+        return asyncio.run(coroutine)
+
+# Awaitable view of a boto3 client: client.describe_x(...) becomes await async_client.describe_x(...)
+class AsyncClient:
+    def __init__(self, engine, client):
+        self._engine = engine
+        self._client = client
+        self._service_name = client.meta.service_model.service_name
+
+    def __getattr__(self, name):
+        method = getattr(self._client, name)
+
+        async def call(**kwargs):
+            return await self._engine.call(self._service_name, method, **kwargs)
+        return call
+
+    async def paginate(self, operation_name, result_key, **kwargs):
+        # pages of one listing are sequential, concurrency comes from awaiting many listings at once
+        return await self._engine.call(self._service_name, lambda: list(reducers.items(self._client, operation_name, result_key, **kwargs)))
+
+    async def reduce(self, operation_name, result_key, reducer, **kwargs):
+        return await self._engine.call(self._service_name, reducers.reduce, self._client, operation_name, result_key, reducer, **kwargs)
+
+# Checkers that overlap their API calls. get_usage is a sync adapter so they keep working wherever a
+# regular checker is expected.
+class AsyncUsageChecker(ABC):
+    @abstractmethod
+    async def get_usage_async(self, engine, region, quota_name):
+        pass
+
+    def get_usage(self, region, quota_name):
+        engine = get_engine()
+        return engine.run(self.get_usage_async(engine, region, quota_name))
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_engine():
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = AsyncEngine(concurrency_limits())
+        return _engine
@@ -1,14 +1,73 @@
+import importlib
 import re
+import threading
 
+# Dispatches quotas to usage checkers.
+#
+# Quotas are looked up by (ServiceCode, QuotaCode) first, which keeps working when AWS renames a
+# quota, then by a single compiled pattern per service built from every registered name pattern.
+# Resolved lookups are cached and each checker class is only instantiated once.
+#
+# Checkers are registered by name ("ec2_checks.AMIsChecker"), a checker module is only imported the
+# first time a quota it handles is dispatched.
 class CheckerRegistry:
     def __init__(self):
-        self.checkers = []
+        self._by_quota_code = {}
+        self._patterns = {}
+        self._combined = {}
+        self._instances = {}
+        self._resolved = {}
+        self._lock = threading.Lock()
 
-    def register(self, pattern, checker_class):
-        self.checkers.append((re.compile(pattern), checker_class))
+    def register(self, service_code, pattern, checker_class, quota_codes=()):
+        with self._lock:
+            patterns = self._patterns.setdefault(service_code, [])
+            patterns.append((f"c{len(patterns)}", pattern, checker_class))
+            for quota_code in quota_codes:
+                self._by_quota_code[(service_code, quota_code)] = checker_class
+            self._combined.pop(service_code, None)
+            self._resolved.clear()
 
-    def get_checker(self, quota_name):
-        for pattern, checker_class in self.checkers:
-            match = pattern.match(quota_name)
-            if match:
-                return checker_class()
+    def services(self):
+        return set(self._patterns)
+
+    def get_checker(self, service_code, quota_code=None, quota_name=''):
+        key = (service_code, quota_code, quota_name)
+        if key in self._resolved:
+            return self._resolved[key]
+
+        checker_class = self._by_quota_code.get((service_code, quota_code))
+        if checker_class is None:
+            checker_class = self._match(service_code, quota_name)
+
+        checker = self._instance(checker_class) if checker_class else None
+        self._resolved[key] = checker
+        return checker
+
+    def _match(self, service_code, quota_name):
+        patterns = self._patterns.get(service_code)
+        if not patterns:
+            return None
+
+        combined = self._combined.get(service_code)
+        if combined is None:
+            # alternatives are tried in registration order, so the first registered pattern still wins
+            combined = re.compile('|'.join(f"(?P<{name}>{pattern})" for name, pattern, _ in patterns))
+            self._combined[service_code] = combined
+
+        match = combined.match(quota_name)
+        if not match:
+            return None
+        return next(checker_class for name, _, checker_class in patterns if name == match.lastgroup)
+
+    def _instance(self, checker_class):
+        with self._lock:
+            if checker_class not in self._instances:
+                self._instances[checker_class] = load(checker_class)()
+            return self._instances[checker_class]
+
+def load(checker_class):
+    if not isinstance(checker_class, str):
+        return checker_class
+    module_name, _, class_name = checker_class.rpartition('.')
+    return getattr(importlib.import_module(module_name), class_name)
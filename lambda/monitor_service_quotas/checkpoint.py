@@ -0,0 +1,30 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Tracks the time left in the current invocation, work stops once less than margin_seconds remain
+class Deadline:
+    def __init__(self, context, margin_seconds=120):
+        self.context = context
+        self.margin_ms = margin_seconds * 1000
+        self.reached = False
+
+    def expired(self):
+        if not self.reached and self.context is not None and self.context.get_remaining_time_in_millis() < self.margin_ms:
+            logger.info("Approaching the Lambda timeout, checkpointing")
+            self.reached = True
+        return self.reached
+
+# Progress of one region (per account), carried between invocations of a resumed run.
+# cursor is the [service code, quota index] of the last checked quota
+def new_progress():
+    return {
+        'done': False,
+        'metrics_done': False,
+        'cursor': None,
+        'scheduler_run': None,
+        'results': []
+    }
+
+def is_checked(progress, position):
+    return progress['cursor'] is not None and tuple(position) <= tuple(progress['cursor'])
@@ -0,0 +1,145 @@
+import api_cache
+import async_engine
+import boto3
+import botocore.session
+import contextvars
+import rate_limiter
+import telemetry
+import threading
+from botocore.config import Config
+from contextlib import contextmanager
+
+# boto3 client creation is not thread safe and regions are checked in parallel
+_lock = threading.Lock()
+
+# (account id, boto3 session) of the member account being checked, None for the local account
+_account = contextvars.ContextVar('account', default=None)
+
+# botocore keeps this many connections per client by default
+DEFAULT_POOL_CONNECTIONS = 10
+
+# Configure boto3 clients with adaptive retries for throttling
+BOTO_CONFIG = Config(
+    retries={
+        'max_attempts': 5,
+        'mode': 'adaptive'  # Automatically handles throttling with exponential backoff
+    },
+    connect_timeout=10,
+    read_timeout=60,
+    tcp_keepalive=True
+)
+
+_session = None
+_loader = None
+
+def _data_loader():
+    global _loader
+    if _loader is None:
+        _loader = botocore.session.get_session().get_component('data_loader')
+    return _loader
+
+def new_session(**kwargs):
+    # service models are loaded once and shared by the sessions of every account
+    session = botocore.session.get_session()
+    session.register_component('data_loader', _data_loader())
+    return boto3.session.Session(botocore_session=session, **kwargs)
+
+def _local_session():
+    global _session
+    if _session is None:
+        _session = new_session()
+    return _session
+
+@contextmanager
+def account_scope(account_id, session):
+    token = _account.set((account_id, session))
+    try:
+        yield
+    finally:
+        _account.reset(token)
+
+def current_account_id():
+    account = _account.get()
+    return account[0] if account else None
+
+def pool_connections(service_name):
+    # the asyncio engine keeps up to this many calls per service in flight on one client
+    return max(DEFAULT_POOL_CONNECTIONS, async_engine.concurrency_limits().get(service_name, async_engine.DEFAULT_SERVICE_CONCURRENCY))
+
+def create_client(service_name, region, config=None):
+    account = _account.get()
+    with _lock:
+        session = account[1] if account else _local_session()
+        client = session.client(service_name, region_name=region, config=config)
+    scope = account[0] if account else None
+    rate_limiter.attach(client, scope=scope)
+    api_cache.attach(client, scope=scope)
+    return telemetry.attach(client)
+
+# One client per (service, region, account) for the whole process, created on first use. Clients of
+# member accounts are replaced when their session is refreshed, and released once every region of
+# the account has been checked.
+class ClientPool:
+    def __init__(self):
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+
+    def get(self, service_name, region):
+        account = _account.get()
+        key = (service_name, region, account[0] if account else None)
+        session = account[1] if account else None
+
+        with self._lock:
+            pooled = self._clients.get(key)
+            if pooled and pooled[0] is session:
+                self._hits += 1
+                return pooled[1]
+
+            config = BOTO_CONFIG.merge(Config(max_pool_connections=pool_connections(service_name)))
+            client = create_client(service_name, region, config=config)
+            self._clients[key] = (session, client)
+            return client
+
+    def reset(self):
+        with self._lock:
+            self._clients.clear()
+            self._hits = 0
+
+    def release(self, account_id):
+        with self._lock:
+            for key in [key for key in self._clients if key[2] == account_id]:
+                del self._clients[key]
+
+    def stats(self):
+        with self._lock:
+            pooled = list(self._clients.values())
+            hits = self._hits
+
+        connections = requests = 0
+        for _, client in pooled:
+            for pool in _connection_pools(client):
+                connections += getattr(pool, 'num_connections', 0)
+                requests += getattr(pool, 'num_requests', 0)
+        return {'clients': len(pooled), 'hits': hits, 'connections': connections, 'requests': requests}
+
+def _connection_pools(client):
+    # urllib3 counts the connections each host pool opened, botocore doesn't expose them otherwise
+    manager = getattr(getattr(client._endpoint, 'http_session', None), '_manager', None)
+    if manager is None:
+        return []
+    return [manager.pools[key] for key in manager.pools.keys() if key in manager.pools]
+
+_pool = ClientPool()
+
+def get_client(service_name, region):
+    return _pool.get(service_name, region)
+
+def reset():
+    _pool.reset()
+
+def release_account(account_id):
+    _pool.release(account_id)
+
+def stats():
+    return _pool.stats()
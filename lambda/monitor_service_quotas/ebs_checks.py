@@ -1,15 +1,13 @@
 from abc import ABC, abstractmethod
-import boto3
-from datetime import datetime
+import async_engine
+import clients
+import reducers
+import snapshot_scanner
 
 class EBSClientSingleton:
-    _instances = {}
-
     @classmethod
     def get_client(cls, region):
-        if region not in cls._instances:
-            cls._instances[region] = boto3.client('ec2', region_name=region)
-        return cls._instances[region]
+        return clients.get_client('ec2', region)
 
 class EBSUsageChecker(ABC):
 
@@ -30,111 +28,34 @@ class VolumeTypeStorageChecker(EBSUsageChecker):
 
     def get_usage(self, region, quota_name):
         ebs = EBSClientSingleton.get_client(region)
-        total_storage = 0
-        next_token = None
 
-        volume_type = self.VOLUME_TYPE_MAP.get(quota_name.split(' volumes')[0].strip())
+        volume_type = self.VOLUME_TYPE_MAP.get(quota_name.removeprefix('Storage for ').split(' volumes')[0].strip())
         if not volume_type:
             raise ValueError(f"Unknown volume type in quota: {quota_name}")
 
-        while True:
-            if next_token:
-                response = ebs.describe_volumes(
-                    Filters=[{'Name': 'volume-type', 'Values': [volume_type]}],
-                    NextToken=next_token
-                )
-            else:
-                response = ebs.describe_volumes(
-                    Filters=[{'Name': 'volume-type', 'Values': [volume_type]}]
-                )
-
-            for volume in response['Volumes']:
-                total_storage += volume['Size']
-
-            next_token = response.get('NextToken')
-            if not next_token:
-                break
-
-        return total_storage
+        total_storage = reducers.reduce(
+            ebs, 'describe_volumes', 'Volumes', reducers.Sum('Size'),
+            Filters=[{'Name': 'volume-type', 'Values': [volume_type]}]
+        )
+        # volume sizes are in GiB, the quota is in TiB
+        return total_storage / 1024
 
 class ProvisionedIOPSChecker(EBSUsageChecker):
     def get_usage(self, region, quota_name):
         ebs = EBSClientSingleton.get_client(region)
-        total_iops = 0
-        next_token = None
-
         volume_type = quota_name.split('IOPS for Provisioned IOPS SSD (')[1].split(')')[0]
-        while True:
-            if next_token:
-                response = ebs.describe_volumes(
-                    Filters=[{'Name': 'volume-type', 'Values': [volume_type]}],
-                    NextToken=next_token
-                )
-            else:
-                response = ebs.describe_volumes(
-                    Filters=[{'Name': 'volume-type', 'Values': [volume_type]}]
-                )
-
-            for volume in response['Volumes']:
-                total_iops += volume['Iops']
-
-            next_token = response.get('NextToken')
-            if not next_token:
-                break
-
-        return total_iops
-
-class ArchivedSnapshotsPerVolumeChecker(EBSUsageChecker):
-    def get_usage(self, region, quota_name):
-        ebs = EBSClientSingleton.get_client(region)
-        snapshot_counts = {}
-        next_token = None
-
-        while True:
-            if next_token:
-                response = ebs.describe_snapshots(
-                    OwnerIds=['self'],
-                    Filters=[{'Name': 'storage-tier', 'Values': ['archive']}],
-                    NextToken=next_token
-                )
-            else:
-                response = ebs.describe_snapshots(
-                    OwnerIds=['self'],
-                    Filters=[{'Name': 'storage-tier', 'Values': ['archive']}]
-                )
-
-            for snapshot in response['Snapshots']:
-                volume_id = snapshot.get('VolumeId')
-                if volume_id:
-                    snapshot_counts[volume_id] = snapshot_counts.get(volume_id, 0) + 1
-
-            next_token = response.get('NextToken')
-            if not next_token:
-                break
-
-        return max(snapshot_counts.values()) if snapshot_counts else 0
-
-class SnapshotsPerRegionChecker(EBSUsageChecker):
-    def get_usage(self, region, quota_name):
-        ebs = EBSClientSingleton.get_client(region)
-        total_snapshots = 0
-        next_token = None
-
-        while True:
-            if next_token:
-                response = ebs.describe_snapshots(
-                    OwnerIds=['self'],
-                    NextToken=next_token
-                )
-            else:
-                response = ebs.describe_snapshots(
-                    OwnerIds=['self']
-                )
+        return reducers.reduce(
+            ebs, 'describe_volumes', 'Volumes', reducers.Sum('Iops'),
+            Filters=[{'Name': 'volume-type', 'Values': [volume_type]}]
+        )
 
-            total_snapshots += len(response['Snapshots'])
+class ArchivedSnapshotsPerVolumeChecker(async_engine.AsyncUsageChecker, EBSUsageChecker):
+    async def get_usage_async(self, engine, region, quota_name):
+        snapshots = await snapshot_scanner.ebs_async(engine, region)
+        return snapshots['max_archived_per_volume']
 
-            next_token = response.get('NextToken')
-            if not next_token:
-                break
+class SnapshotsPerRegionChecker(async_engine.AsyncUsageChecker, EBSUsageChecker):
+    async def get_usage_async(self, engine, region, quota_name):
+        snapshots = await snapshot_scanner.ebs_async(engine, region)
+        return snapshots['snapshots']
 
-        return total_snapshots
@@ -1,15 +1,21 @@
 from abc import ABC, abstractmethod
-import boto3
+import asyncio
+import async_engine
+import clients
+import image_permissions
+import os
+import re
+import reducers
+import run_cache
+import state_store
+import tgw_topology
+import threading
 from datetime import datetime
 
 class EC2ClientSingleton:
-    _instances = {}
-
     @classmethod
     def get_client(cls, region):
-        if region not in cls._instances:
-            cls._instances[region] = boto3.client('ec2', region_name=region)
-        return cls._instances[region]
+        return clients.get_client('ec2', region)
 
 class EC2UsageChecker(ABC):
 
@@ -17,52 +23,118 @@ class EC2UsageChecker(ABC):
     def get_usage(self, region, quota_name):
         pass
 
+# Instance families of the vCPU based On-Demand and Spot quotas, as named in the quotas. Instance
+# types are matched in this order, so the longer prefixes (hpc, inf, dl, trn) win over the
+# single letters of the standard family.
+INSTANCE_FAMILIES = [
+    ('High Memory', re.compile(r'^u\d*[a-z]*-')),
+    ('HPC', re.compile(r'^hpc')),
+    ('Inf', re.compile(r'^inf')),
+    ('DL', re.compile(r'^dl')),
+    ('Trn', re.compile(r'^trn')),
+    ('G and VT', re.compile(r'^(g|vt)')),
+    ('P', re.compile(r'^p')),
+    ('X', re.compile(r'^x')),
+    ('F', re.compile(r'^f')),
+    ('Standard (A, C, D, H, I, M, R, T, Z)', re.compile(r'^[acdhimrtz]')),
+]
+
+# Quotas that only cover some generations of a family, e.g. the P Spot quotas: (family, instance types)
+PARTIAL_FAMILIES = {
+    'P4, P3 and P2': ('P', re.compile(r'^p[234]')),
+    'P5': ('P', re.compile(r'^p5')),
+}
+
+def instance_family(instance_type):
+    return next((family for family, pattern in INSTANCE_FAMILIES if pattern.match(instance_type)), None)
+
+def family_vcpus(running_vcpus, lifecycle, quota_family):
+    family, instance_types = PARTIAL_FAMILIES.get(quota_family, (quota_family, None))
+    if family not in dict(INSTANCE_FAMILIES):
+        raise ValueError(f"Unknown instance family: {quota_family}")
+    return sum(
+        vcpus for (instance_lifecycle, instance_type), vcpus in running_vcpus.items()
+        if instance_lifecycle == lifecycle and instance_family(instance_type) == family and (instance_types is None or instance_types.match(instance_type))
+    )
+
+# vCPUs per instance type, the table only changes when AWS launches new types so it is kept for the
+# life of the execution environment
+_instance_type_vcpus = {}
+_instance_type_lock = threading.Lock()
+
+def get_instance_type_vcpus(region, instance_types):
+    with _instance_type_lock:
+        missing = sorted(instance_type for instance_type in instance_types if (region, instance_type) not in _instance_type_vcpus)
+
+    if missing:
+        ec2 = EC2ClientSingleton.get_client(region)
+        for start in range(0, len(missing), 100):
+            for instance_type in reducers.items(ec2, 'describe_instance_types', 'InstanceTypes', InstanceTypes=missing[start:start + 100]):
+                with _instance_type_lock:
+                    _instance_type_vcpus[(region, instance_type['InstanceType'])] = instance_type['VCpuInfo']['DefaultVCpus']
+
+    with _instance_type_lock:
+        return {instance_type: _instance_type_vcpus.get((region, instance_type), 0) for instance_type in instance_types}
+
+# One pass over the pending and running instances of a region, only the instance count per
+# (lifecycle, instance type) is kept so memory doesn't grow with the fleet. Returns the vCPUs per
+# (lifecycle, instance type), which answers every On-Demand and Spot quota at once.
+def scan_running_vcpus(region):
+    ec2 = EC2ClientSingleton.get_client(region)
+    counts = {}
+
+    reservations = reducers.items(ec2, 'describe_instances', 'Reservations', Filters=[{'Name': 'instance-state-name', 'Values': ['pending', 'running']}])
+    for reservation in reservations:
+        for instance in reservation['Instances']:
+            # instances on Dedicated Hosts count against the host quotas instead
+            if instance.get('Placement', {}).get('Tenancy') == 'host':
+                continue
+            lifecycle = 'spot' if instance.get('InstanceLifecycle') == 'spot' else 'on-demand'
+            key = (lifecycle, instance['InstanceType'])
+            counts[key] = counts.get(key, 0) + 1
+
+    vcpus = get_instance_type_vcpus(region, {instance_type for _, instance_type in counts})
+    return {(lifecycle, instance_type): count * vcpus[instance_type] for (lifecycle, instance_type), count in counts.items()}
+
+def get_running_vcpus(region):
+    return run_cache.get('running-vcpus', region, lambda: scan_running_vcpus(region))
+
 class RunningOnDemandInstancesChecker(EC2UsageChecker):
     def get_usage(self, region, quota_name):
-        ec2 = EC2ClientSingleton.get_client(region)
-        response = ec2.describe_instances(Filters=[{'Name': 'instance-state-name', 'Values': ['running']}])
-        return len([i for r in response['Reservations'] for i in r['Instances'] if i['InstanceType'][0] in 'ACDHIMRTZ'])
+        family = quota_name.removeprefix('Running On-Demand ').removesuffix(' instances')
+        return family_vcpus(get_running_vcpus(region), 'on-demand', family)
+
+class SpotInstanceRequestsChecker(EC2UsageChecker):
+    def get_usage(self, region, quota_name):
+        family = quota_name.removeprefix('All ').removesuffix(' Spot Instance Requests')
+        return family_vcpus(get_running_vcpus(region), 'spot', family)
 
 class ClientVPNEndpointsChecker(EC2UsageChecker):
     def get_usage(self, region, quota_name):
         ec2 = EC2ClientSingleton.get_client(region)
-        response = ec2.describe_client_vpn_endpoints()
-        return len(response['ClientVpnEndpoints'])
+        return reducers.reduce(ec2, 'describe_client_vpn_endpoints', 'ClientVpnEndpoints', reducers.Count())
 
 class AMIsChecker(EC2UsageChecker):
     def get_usage(self, region, quota_name):
         ec2 = EC2ClientSingleton.get_client(region)
-        response = ec2.describe_images(Owners=['self'])
-        return len(response['Images'])
+        return reducers.reduce(ec2, 'describe_images', 'Images', reducers.Count(), Owners=['self'])
 
-class MulticastDomainAssociationsChecker(EC2UsageChecker):
-    def get_usage(self, region, quota_name):
-        ec2 = EC2ClientSingleton.get_client(region)
-        response = ec2.describe_transit_gateway_multicast_domains()
-        associations = [domain for domain in response['TransitGatewayMulticastDomains']
-                        if domain['State'] == 'associated']
-        return len(associations)
+class MulticastDomainAssociationsChecker(async_engine.AsyncUsageChecker, EC2UsageChecker):
+    async def get_usage_async(self, engine, region, quota_name):
+        topology = await tgw_topology.get_async(engine, region)
+        return topology.max_multicast_domains_per_vpc()
 
-class MulticastNetworkInterfacesChecker(EC2UsageChecker):
-    def get_usage(self, region, quota_name):
-        ec2 = EC2ClientSingleton.get_client(region)
-        response = ec2.describe_transit_gateways()
-        max_interfaces = 0
-        for tgw in response['TransitGateways']:
-            tgw_id = tgw['TransitGatewayId']
-            multicast_domains = ec2.describe_transit_gateway_multicast_domains(
-                Filters=[{'Name': 'transit-gateway-id', 'Values': [tgw_id]}]
-            )
-            interfaces = sum(len(domain.get('TransitGatewayAttachmentIds', []))
-                             for domain in multicast_domains['TransitGatewayMulticastDomains'])
-            max_interfaces = max(max_interfaces, interfaces)
-        return max_interfaces
+class MulticastNetworkInterfacesChecker(async_engine.AsyncUsageChecker, EC2UsageChecker):
+    async def get_usage_async(self, engine, region, quota_name):
+        topology = await tgw_topology.get_async(engine, region)
+        return topology.max_multicast_interfaces()
 
 class RunningDedicatedHostsChecker(EC2UsageChecker):
     def get_usage(self, region, quota_name):
         ec2 = EC2ClientSingleton.get_client(region)
         instance_family = quota_name.split("Running Dedicated ")[1].split(" Hosts")[0]
-        response = ec2.describe_hosts(
+        return reducers.reduce(
+            ec2, 'describe_hosts', 'Hosts', reducers.Count(),
             Filters=[
                 {
                     'Name': 'instance-type',
@@ -74,7 +146,6 @@ class RunningDedicatedHostsChecker(EC2UsageChecker):
                 }
             ]
         )
-        return len(response['Hosts'])
 
 class NewReservedInstancesChecker(EC2UsageChecker):
     def get_usage(self, region, quota_name):
@@ -83,7 +154,9 @@ class NewReservedInstancesChecker(EC2UsageChecker):
         now = datetime.utcnow()
         start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
 
-        response = ec2.describe_reserved_instances(
+        return reducers.reduce(
+            ec2, 'describe_reserved_instances', 'ReservedInstances',
+            reducers.Count(lambda ri: start_of_month <= ri['Start'].replace(tzinfo=None) <= now),
             Filters=[
                 {
                     'Name': 'state',
@@ -92,130 +165,82 @@ class NewReservedInstancesChecker(EC2UsageChecker):
             ]
         )
 
-        new_ri_count = sum(
-            1 for ri in response['ReservedInstances']
-            if start_of_month <= ri['Start'].replace(tzinfo=None) <= now
-        )
+class AttachmentsPerTransitGatewayChecker(async_engine.AsyncUsageChecker, EC2UsageChecker):
+    async def get_usage_async(self, engine, region, quota_name):
+        topology = await tgw_topology.get_async(engine, region)
+        return topology.max_attachments()
 
-        return new_ri_count
+class TransitGatewaysPerAccountChecker(async_engine.AsyncUsageChecker, EC2UsageChecker):
+    async def get_usage_async(self, engine, region, quota_name):
+        topology = await tgw_topology.get_async(engine, region)
+        return topology.transit_gateways
 
-class AttachmentsPerTransitGatewayChecker(EC2UsageChecker):
-    def get_usage(self, region, quota_name):
-        ec2 = EC2ClientSingleton.get_client(region)
-        response = ec2.describe_transit_gateways()
-        max_attachments = 0
-        for tgw in response['TransitGateways']:
-            tgw_id = tgw['TransitGatewayId']
-            attachments = ec2.describe_transit_gateway_attachments(
-                Filters=[{'Name': 'transit-gateway-id', 'Values': [tgw_id]}]
-            )
-            attachment_count = len(attachments['TransitGatewayAttachments'])
-            max_attachments = max(max_attachments, attachment_count)
-        return max_attachments
-
-class TransitGatewaysPerAccountChecker(EC2UsageChecker):
+class VPNConnectionsPerVGWChecker(EC2UsageChecker):
     def get_usage(self, region, quota_name):
         ec2 = EC2ClientSingleton.get_client(region)
-        response = ec2.describe_transit_gateways()
-        return len(response['TransitGateways'])
+        return reducers.reduce(ec2, 'describe_vpn_connections', 'VpnConnections', reducers.MaxCountBy('VpnGatewayId'))
 
-class VPNConnectionsPerVGWChecker(EC2UsageChecker):
+class VPNConnectionsPerRegionChecker(EC2UsageChecker):
     def get_usage(self, region, quota_name):
         ec2 = EC2ClientSingleton.get_client(region)
-        response = ec2.describe_vpn_connections()
+        return reducers.reduce(ec2, 'describe_vpn_connections', 'VpnConnections', reducers.Count())
 
-        vgw_connections = {}
-        for vpn in response['VpnConnections']:
-            vgw_id = vpn.get('VpnGatewayId')
-            if vgw_id:
-                vgw_connections[vgw_id] = vgw_connections.get(vgw_id, 0) + 1
+class RoutesPerTransitGatewayChecker(async_engine.AsyncUsageChecker, EC2UsageChecker):
+    async def get_usage_async(self, engine, region, quota_name):
+        # routes of every route table of a transit gateway count against its quota
+        topology = await tgw_topology.get_async(engine, region)
+        return topology.max_routes()
 
-        return max(vgw_connections.values()) if vgw_connections else 0
+# How long a cached AMI launch permission is reused for an unchanged image (in hours)
+AMI_PERMISSION_TTL_HOURS = float(os.environ.get('SERVICE_QUOTA_AMI_PERMISSION_TTL_HOURS', 72))
 
-class VPNConnectionsPerRegionChecker(EC2UsageChecker):
-    def get_usage(self, region, quota_name):
-        ec2 = EC2ClientSingleton.get_client(region)
-        response = ec2.describe_vpn_connections()
-        return len(response['VpnConnections'])
+class AMISharingChecker(async_engine.AsyncUsageChecker, EC2UsageChecker):
+    async def get_usage_async(self, engine, region, quota_name):
+        ec2 = engine.client(EC2ClientSingleton.get_client(region))
+        images = await ec2.paginate('describe_images', 'Images', Owners=['self'])
 
-class RoutesPerTransitGatewayChecker(EC2UsageChecker):
-    def get_usage(self, region, quota_name):
-        ec2 = EC2ClientSingleton.get_client(region)
-        response = ec2.describe_transit_gateways()
-        max_routes = 0
-
-        for tgw in response['TransitGateways']:
-            tgw_id = tgw['TransitGatewayId']
-            route_tables = ec2.describe_transit_gateway_route_tables(
-                Filters=[{'Name': 'transit-gateway-id', 'Values': [tgw_id]}]
-            )
-
-            for route_table in route_tables['TransitGatewayRouteTables']:
-                route_table_id = route_table['TransitGatewayRouteTableId']
-                routes = ec2.search_transit_gateway_routes(
-                    TransitGatewayRouteTableId=route_table_id,
-                    Filters=[{'Name': 'type', 'Values': ['static', 'propagated']}]
-                )
-                max_routes = max(max_routes, len(routes['Routes']))
-
-        return max_routes
-
-class AMISharingChecker(EC2UsageChecker):
-    def get_usage(self, region, quota_name):
-        ec2 = EC2ClientSingleton.get_client(region)
-        response = ec2.describe_images(Owners=['self'])
+        account_id = clients.current_account_id()
+        cache = image_permissions.LaunchPermissionCache(
+            region,
+            store=state_store.get_store(),
+            ttl_seconds=AMI_PERMISSION_TTL_HOURS * 3600,
+            cache_key=f"ami-launch-permissions/{account_id}/{region}" if account_id else None
+        )
 
-        shared_ami_count = 0
-        for image in response['Images']:
-            launch_permissions = ec2.describe_image_attribute(
-                ImageId=image['ImageId'],
-                Attribute='launchPermission'
-            )
-            if 'LaunchPermissions' in launch_permissions:
-                # Count AMIs shared with specific accounts or made public
-                if launch_permissions['LaunchPermissions'] or 'all' in [perm.get('Group', '') for perm in launch_permissions['LaunchPermissions']]:
-                    shared_ami_count += 1
+        async def lookup(image):
+            response = await ec2.describe_image_attribute(ImageId=image['ImageId'], Attribute='launchPermission')
+            # shared with specific accounts, organizations or made public
+            cache.put(image, bool(response.get('LaunchPermissions')))
 
-        return shared_ami_count
+        # public images are shared without looking, the lookups run as concurrently as the engine
+        # allows for ec2
+        stale = [image for image in images if not image.get('Public') and cache.get(image) is None]
+        try:
+            await asyncio.gather(*(lookup(image) for image in stale))
+        finally:
+            # keep what was looked up even when a lookup failed
+            cache.save(image['ImageId'] for image in images)
 
-class CustomerGatewaysPerRegionChecker(EC2UsageChecker):
-    def get_usage(self, region, quota_name):
-        ec2 = EC2ClientSingleton.get_client(region)
-        response = ec2.describe_customer_gateways()
-        return len(response['CustomerGateways'])
+        return sum(1 for image in images if image.get('Public') or cache.get(image))
 
-class RoutesPerClientVPNEndpointChecker(EC2UsageChecker):
+class CustomerGatewaysPerRegionChecker(EC2UsageChecker):
     def get_usage(self, region, quota_name):
         ec2 = EC2ClientSingleton.get_client(region)
-        response = ec2.describe_client_vpn_endpoints()
+        return reducers.reduce(ec2, 'describe_customer_gateways', 'CustomerGateways', reducers.Count())
 
-        max_routes = 0
-        for endpoint in response['ClientVpnEndpoints']:
-            endpoint_id = endpoint['ClientVpnEndpointId']
-            routes = ec2.describe_client_vpn_routes(ClientVpnEndpointId=endpoint_id)
-            route_count = len(routes['Routes'])
-            max_routes = max(max_routes, route_count)
+class RoutesPerClientVPNEndpointChecker(async_engine.AsyncUsageChecker, EC2UsageChecker):
+    async def get_usage_async(self, engine, region, quota_name):
+        ec2 = engine.client(EC2ClientSingleton.get_client(region))
+        endpoints = await ec2.paginate('describe_client_vpn_endpoints', 'ClientVpnEndpoints')
 
-        return max_routes
+        route_counts = await asyncio.gather(*(
+            ec2.reduce('describe_client_vpn_routes', 'Routes', reducers.Count(), ClientVpnEndpointId=endpoint['ClientVpnEndpointId'])
+            for endpoint in endpoints
+        ))
+        return max(route_counts, default=0)
 
 class EC2VPCElasticIPsChecker(EC2UsageChecker):
     def get_usage(self, region, quota_name):
         ec2 = EC2ClientSingleton.get_client(region)
-        eip_count = 0
-        next_token = None
-
-        while True:
-            if next_token:
-                response = ec2.describe_addresses(NextToken=next_token)
-            else:
-                response = ec2.describe_addresses()
-
-            for address in response['Addresses']:
-                if 'Domain' in address and address['Domain'] == 'vpc':
-                    eip_count += 1
-
-            next_token = response.get('NextToken')
-            if not next_token:
-                break
-
-        return eip_count
+        # describe_addresses isn't paginated, every address comes back in one response
+        return reducers.reduce(ec2, 'describe_addresses', 'Addresses', reducers.Count(), Filters=[{'Name': 'domain', 'Values': ['vpc']}])
@@ -0,0 +1,46 @@
+import asyncio
+import clients
+import run_cache
+
+# Clusters, node groups and Fargate profiles of a region, listed once per run for every eks quota.
+# The listings of all clusters and the describe_nodegroup calls run concurrently, bounded by the eks
+# concurrency of the async engine.
+class EKSInventory:
+    def __init__(self, clusters):
+        # cluster name: {'nodegroups': {nodegroup name: max size}, 'fargate_profiles': count}
+        self.clusters = clusters
+
+    def cluster_count(self):
+        return len(self.clusters)
+
+    def max_nodegroups_per_cluster(self):
+        return max((len(cluster['nodegroups']) for cluster in self.clusters.values()), default=0)
+
+    def max_fargate_profiles_per_cluster(self):
+        return max((cluster['fargate_profiles'] for cluster in self.clusters.values()), default=0)
+
+    def max_nodes_per_nodegroup(self):
+        return max((size for cluster in self.clusters.values() for size in cluster['nodegroups'].values()), default=0)
+
+async def _cluster(eks, cluster_name):
+    nodegroup_names, fargate_profiles = await asyncio.gather(
+        eks.paginate('list_nodegroups', 'nodegroups', clusterName=cluster_name),
+        eks.paginate('list_fargate_profiles', 'fargateProfileNames', clusterName=cluster_name)
+    )
+    responses = await asyncio.gather(*(
+        eks.describe_nodegroup(clusterName=cluster_name, nodegroupName=nodegroup_name)
+        for nodegroup_name in nodegroup_names
+    ))
+    return {
+        'nodegroups': {response['nodegroup']['nodegroupName']: response['nodegroup']['scalingConfig']['maxSize'] for response in responses},
+        'fargate_profiles': len(fargate_profiles)
+    }
+
+async def build_async(engine, region):
+    eks = engine.client(clients.get_client('eks', region))
+    cluster_names = await eks.paginate('list_clusters', 'clusters')
+    clusters = await asyncio.gather(*(_cluster(eks, cluster_name) for cluster_name in cluster_names))
+    return EKSInventory(dict(zip(cluster_names, clusters)))
+
+async def get_async(engine, region):
+    return await run_cache.get_async('eks-inventory', region, lambda: build_async(engine, region))
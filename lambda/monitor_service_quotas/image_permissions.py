@@ -0,0 +1,78 @@
+import logging
+import threading
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# Tier one: survives warm Lambda invocations
+_memory = {}
+_memory_lock = threading.Lock()
+
+# Caches whether each AMI of a region is shared, keyed by image id.
+#
+# Sharing an image doesn't change anything describe_images returns (apart from Public), so an entry
+# is reused while the image's fingerprint (creation date, state, public flag) is unchanged and at
+# most for ttl_seconds, after which its launch permissions are looked up again. Entries are read
+# from the in-process cache first, then from the persistent state store.
+class LaunchPermissionCache:
+
+    def __init__(self, region, store=None, ttl_seconds=259200, cache_key=None):
+        self.region = region
+        self.store = store
+        self.ttl_seconds = ttl_seconds
+        self.cache_key = cache_key or f"ami-launch-permissions/{region}"
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._images = self._load()
+
+    def _load(self):
+        with _memory_lock:
+            images = _memory.get(self.cache_key)
+        if images is None and self.store:
+            try:
+                images = self.store.get(self.cache_key)
+            except Exception as e:
+                logger.error(f"Error loading AMI launch permissions for {self.region}: {str(e)}")
+        return dict(images or {})
+
+    @staticmethod
+    def fingerprint(image):
+        return f"{image.get('CreationDate')}/{image.get('State')}/{image.get('Public')}"
+
+    def get(self, image):
+        with self._lock:
+            entry = self._images.get(image['ImageId'])
+        if not entry or entry['fingerprint'] != self.fingerprint(image):
+            return None
+
+        # spread the expiry of the entries so they don't all refresh on the same run, the jitter only
+        # ever extends the TTL so an entry is never stale before the next scheduled run
+        jitter = (zlib.crc32(image['ImageId'].encode()) % 1000) / 1000 * 0.2 * self.ttl_seconds
+        if time.time() - entry['checked_at'] >= self.ttl_seconds + jitter:
+            return None
+        return entry['shared']
+
+    def put(self, image, shared):
+        with self._lock:
+            self._images[image['ImageId']] = {'fingerprint': self.fingerprint(image), 'shared': shared, 'checked_at': time.time()}
+            self._dirty = True
+
+    def save(self, image_ids):
+        with self._lock:
+            # deregistered images are dropped
+            for image_id in set(self._images) - set(image_ids):
+                del self._images[image_id]
+                self._dirty = True
+            images = dict(self._images)
+            dirty = self._dirty
+
+        with _memory_lock:
+            _memory[self.cache_key] = images
+
+        if dirty and self.store:
+            try:
+                self.store.put(self.cache_key, images)
+                self._dirty = False
+            except Exception as e:
+                logger.error(f"Error saving AMI launch permissions for {self.region}: {str(e)}")
@@ -1,20 +1,26 @@
 import os
-import boto3
+import asyncio
+import contextvars
 import json
-import time
-from datetime import datetime, timedelta
-from botocore.config import Config
+import threading
+import uuid
+import zlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import accounts
+import api_cache
+import async_engine
+import checkpoint
 import checker
-import cloudformation_checks
-import ebs_checks
-import ec2_checks
-import efs_checks
-import eks_checks
-import es_checks
-import rds_checks
-import route53_checks
-import workspaces_checks
-import vpc_checks
+import clients
+import quota_catalog
+import run_cache
+import scheduler
+import sharding
+import state_store
+import telemetry
+import utilization_metrics
+import planner
 import logging
 
 logger = logging.getLogger(__name__)
@@ -23,8 +29,6 @@ ch = logging.StreamHandler()
 ch.setLevel(os.environ.get('LOG_LEVEL', logging.INFO))
 logger.addHandler(ch)
 
-sns = boto3.client('sns')
-
 # generally skip rates - this is meant to capture service limits
 quota_name_exclusions = [
     'concurrently running',
@@ -181,154 +185,488 @@ skip_services = [
     'wellarchitected'
     ]
 
-cloudformation_registry = checker.CheckerRegistry()
-cloudformation_registry.register(r'^Stack instances per stack set$', cloudformation_checks.StackInstancesPerStackSetChecker)
-cloudformation_registry.register(r'^Stack count$', cloudformation_checks.StackCountChecker)
-
-ebs_registry = checker.CheckerRegistry()
-ebs_registry.register(r'^IOPS for Provisioned IOPS SSD \(io1\) volumes$', ebs_checks.ProvisionedIOPSChecker)
-ebs_registry.register(r'^IOPS for Provisioned IOPS SSD \(io2\) volumes$', ebs_checks.ProvisionedIOPSChecker)
-ebs_registry.register(r'^Snapshots per Region$', ebs_checks.SnapshotsPerRegionChecker)
-ebs_registry.register(r'^Archived snapshots per volume$', ebs_checks.ArchivedSnapshotsPerVolumeChecker)
-
-for volume_type in ebs_checks.VolumeTypeStorageChecker.VOLUME_TYPE_MAP.keys():
-    ebs_registry.register(f'^Storage for {volume_type} volumes, in TiB$', ebs_checks.VolumeTypeStorageChecker)
-
-ec2_registry = checker.CheckerRegistry()
-ec2_registry.register(r'^Running On-Demand Standard \(A, C, D, H, I, M, R, T, Z\) instances$', ec2_checks.RunningOnDemandInstancesChecker)
-ec2_registry.register(r'^Client VPN endpoints per Region$', ec2_checks.ClientVPNEndpointsChecker)
-ec2_registry.register(r'^AMIs$', ec2_checks.AMIsChecker)
-ec2_registry.register(r'^Multicast domain associations per VPC$', ec2_checks.MulticastDomainAssociationsChecker)
-ec2_registry.register(r'^Multicast Network Interfaces per transit gateway$', ec2_checks.MulticastNetworkInterfacesChecker)
-ec2_registry.register(r'^New Reserved Instances per month', ec2_checks.NewReservedInstancesChecker)
-ec2_registry.register(r'^Running Dedicated ([A-Za-z0-9-]+) Hosts', ec2_checks.RunningDedicatedHostsChecker)
-ec2_registry.register(r'^Attachments per transit gateway', ec2_checks.AttachmentsPerTransitGatewayChecker)
-ec2_registry.register(r'^Transit gateways per account', ec2_checks.TransitGatewaysPerAccountChecker)
-ec2_registry.register(r'^VPN connections per VGW$', ec2_checks.VPNConnectionsPerVGWChecker)
-ec2_registry.register(r'^VPN connections per region$', ec2_checks.VPNConnectionsPerRegionChecker)
-ec2_registry.register(r'^Routes per transit gateway$', ec2_checks.RoutesPerTransitGatewayChecker)
-ec2_registry.register(r'^Customer gateways per region$', ec2_checks.CustomerGatewaysPerRegionChecker)
-ec2_registry.register(r'^AMI sharing$', ec2_checks.AMISharingChecker)
-ec2_registry.register(r'^Routes per Client VPN endpoint$', ec2_checks.RoutesPerClientVPNEndpointChecker)
-ec2_registry.register(r'^EC2-VPC Elastic IPs$', ec2_checks.EC2VPCElasticIPsChecker)
-
-efs_registry = checker.CheckerRegistry()
-efs_registry.register(r'^File systems per account$', efs_checks.FileSystemsPerAccountChecker)
-
-eks_registry = checker.CheckerRegistry()
-eks_registry.register(r'^Clusters$', eks_checks.ClustersChecker)
-eks_registry.register(r'^Nodes per managed node group$', eks_checks.NodesPerManagedNodeGroupChecker)
-eks_registry.register(r'^Fargate profiles per cluster$', eks_checks.FargateProfilesPerClusterChecker)
-eks_registry.register(r'^Managed node groups per cluster$', eks_checks.ManagedNodeGroupsPerClusterChecker)
-
-es_registry = checker.CheckerRegistry()
-es_registry.register(r'^Instances per domain$', es_checks.InstancesPerDomainChecker)
-es_registry.register(r'^Domains per region$', es_checks.DomainsPerRegionChecker)
-
-rds_registry = checker.CheckerRegistry()
-rds_registry.register(r'^Total storage for all DB instances$', rds_checks.TotalStorageForAllDBInstancesChecker)
-rds_registry.register(r'^Manual DB cluster snapshots$', rds_checks.ManualDBClusterSnapshotsChecker)
-rds_registry.register(r'^Parameter groups$', rds_checks.ParameterGroupsChecker)
-rds_registry.register(r'^Manual DB instance snapshots$', rds_checks.ManualDBInstanceSnapshotsChecker)
-rds_registry.register(r'^DB clusters$', rds_checks.DBClustersChecker)
-rds_registry.register(r'^DB Instances$', rds_checks.DBInstancesChecker)
-
-vpc_registry = checker.CheckerRegistry()
-vpc_registry.register(r'^VPCs per Region$', vpc_checks.VPCsPerRegionChecker)
-vpc_registry.register(r'^Subnets per VPC$', vpc_checks.SubnetsPerVPCChecker)
-vpc_registry.register(r'^Network interfaces per Region$', vpc_checks.NetworkInterfacesPerRegionChecker)
-vpc_registry.register(r'^Route tables per VPC$', vpc_checks.RouteTablesPerVPCChecker)
-
-workspaces_registry = checker.CheckerRegistry()
-workspaces_registry.register(r'^GraphicsPro WorkSpaces$', workspaces_checks.WorkspacesChecker)
-workspaces_registry.register(r'^Standby WorkSpaces$', workspaces_checks.WorkspacesChecker)
-workspaces_registry.register(r'^WorkSpaces$', workspaces_checks.WorkspacesChecker)
-workspaces_registry.register(r'^Images$', workspaces_checks.WorkspacesImagesChecker)
-
-route53_registry = checker.CheckerRegistry()
-route53_registry.register(r'^Hosted zones$', route53_checks.HostedZonesChecker)
-route53_registry.register(r'^Health checks$', route53_checks.HealthChecksChecker)
-
-# Configure boto3 client with adaptive retries for throttling
-BOTO_CONFIG = Config(
-    retries={
-        'max_attempts': 5,
-        'mode': 'adaptive'  # Automatically handles throttling with exponential backoff
-    }
-)
-
-# Rate limiting delay between API calls (in seconds)
-# ~6-7 requests/second, safely under AWS rate limits
-API_RATE_LIMIT_DELAY = 0.15
+registry = checker.CheckerRegistry()
+registry.register('cloudformation', r'^Stack instances per stack set$', 'cloudformation_checks.StackInstancesPerStackSetChecker')
+registry.register('cloudformation', r'^Stack count$', 'cloudformation_checks.StackCountChecker', quota_codes=['L-0485CB21'])
+
+registry.register('ebs', r'^IOPS for Provisioned IOPS SSD \(io1\) volumes$', 'ebs_checks.ProvisionedIOPSChecker')
+registry.register('ebs', r'^IOPS for Provisioned IOPS SSD \(io2\) volumes$', 'ebs_checks.ProvisionedIOPSChecker')
+registry.register('ebs', r'^Snapshots per Region$', 'ebs_checks.SnapshotsPerRegionChecker', quota_codes=['L-309BACF6'])
+registry.register('ebs', r'^Archived snapshots per volume$', 'ebs_checks.ArchivedSnapshotsPerVolumeChecker')
+
+registry.register('ebs', r'^Storage for .+ volumes, in TiB$', 'ebs_checks.VolumeTypeStorageChecker')
+
+registry.register('ec2', r'^Running On-Demand .+ instances$', 'ec2_checks.RunningOnDemandInstancesChecker', quota_codes=['L-1216C47A'])
+registry.register('ec2', r'^All .+ Spot Instance Requests$', 'ec2_checks.SpotInstanceRequestsChecker', quota_codes=['L-34B43A08'])
+registry.register('ec2', r'^Client VPN endpoints per Region$', 'ec2_checks.ClientVPNEndpointsChecker')
+registry.register('ec2', r'^AMIs$', 'ec2_checks.AMIsChecker')
+registry.register('ec2', r'^Multicast domain associations per VPC$', 'ec2_checks.MulticastDomainAssociationsChecker')
+registry.register('ec2', r'^Multicast Network Interfaces per transit gateway$', 'ec2_checks.MulticastNetworkInterfacesChecker')
+registry.register('ec2', r'^New Reserved Instances per month', 'ec2_checks.NewReservedInstancesChecker')
+registry.register('ec2', r'^Running Dedicated ([A-Za-z0-9-]+) Hosts', 'ec2_checks.RunningDedicatedHostsChecker')
+registry.register('ec2', r'^Attachments per transit gateway', 'ec2_checks.AttachmentsPerTransitGatewayChecker')
+registry.register('ec2', r'^Transit gateways per account', 'ec2_checks.TransitGatewaysPerAccountChecker')
+registry.register('ec2', r'^VPN connections per VGW$', 'ec2_checks.VPNConnectionsPerVGWChecker')
+registry.register('ec2', r'^VPN connections per region$', 'ec2_checks.VPNConnectionsPerRegionChecker')
+registry.register('ec2', r'^Routes per transit gateway$', 'ec2_checks.RoutesPerTransitGatewayChecker')
+registry.register('ec2', r'^Customer gateways per region$', 'ec2_checks.CustomerGatewaysPerRegionChecker')
+registry.register('ec2', r'^AMI sharing$', 'ec2_checks.AMISharingChecker')
+registry.register('ec2', r'^Routes per Client VPN endpoint$', 'ec2_checks.RoutesPerClientVPNEndpointChecker')
+registry.register('ec2', r'^EC2-VPC Elastic IPs$', 'ec2_checks.EC2VPCElasticIPsChecker', quota_codes=['L-0263D0A3'])
+
+registry.register('elasticfilesystem', r'^File systems per account$', 'efs_checks.FileSystemsPerAccountChecker', quota_codes=['L-848C634D'])
+
+registry.register('eks', r'^Clusters$', 'eks_checks.ClustersChecker', quota_codes=['L-1194D53C'])
+registry.register('eks', r'^Nodes per managed node group$', 'eks_checks.NodesPerManagedNodeGroupChecker')
+registry.register('eks', r'^Fargate profiles per cluster$', 'eks_checks.FargateProfilesPerClusterChecker')
+registry.register('eks', r'^Managed node groups per cluster$', 'eks_checks.ManagedNodeGroupsPerClusterChecker')
+
+registry.register('es', r'^Instances per domain$', 'es_checks.InstancesPerDomainChecker')
+registry.register('es', r'^Domains per region$', 'es_checks.DomainsPerRegionChecker')
+
+registry.register('rds', r'^Total storage for all DB instances$', 'rds_checks.TotalStorageForAllDBInstancesChecker', quota_codes=['L-7ADDB58A'])
+registry.register('rds', r'^Manual DB cluster snapshots$', 'rds_checks.ManualDBClusterSnapshotsChecker')
+registry.register('rds', r'^Parameter groups$', 'rds_checks.ParameterGroupsChecker')
+registry.register('rds', r'^Manual DB instance snapshots$', 'rds_checks.ManualDBInstanceSnapshotsChecker')
+registry.register('rds', r'^DB clusters$', 'rds_checks.DBClustersChecker', quota_codes=['L-952B80B8'])
+registry.register('rds', r'^DB Instances$', 'rds_checks.DBInstancesChecker', quota_codes=['L-7B6409FD'])
+
+registry.register('vpc', r'^VPCs per Region$', 'vpc_checks.VPCsPerRegionChecker', quota_codes=['L-F678F1CE'])
+registry.register('vpc', r'^Subnets per VPC$', 'vpc_checks.SubnetsPerVPCChecker', quota_codes=['L-407747CB'])
+registry.register('vpc', r'^Network interfaces per Region$', 'vpc_checks.NetworkInterfacesPerRegionChecker', quota_codes=['L-DF5E4CA3'])
+registry.register('vpc', r'^Route tables per VPC$', 'vpc_checks.RouteTablesPerVPCChecker', quota_codes=['L-589F43AA'])
+registry.register('vpc', r'^Routes per route table$', 'vpc_checks.RoutesPerRouteTableChecker', quota_codes=['L-93826ACB'])
+registry.register('vpc', r'^IPv4 CIDR blocks per VPC$', 'vpc_checks.IPv4CIDRBlocksPerVPCChecker', quota_codes=['L-83CA0A9D'])
+registry.register('vpc', r'^Internet gateways per Region$', 'vpc_checks.InternetGatewaysPerRegionChecker', quota_codes=['L-A4707A72'])
+registry.register('vpc', r'^NAT gateways per Availability Zone$', 'vpc_checks.NATGatewaysPerAZChecker', quota_codes=['L-FE5A380F'])
+registry.register('vpc', r'^Network ACLs per VPC$', 'vpc_checks.NetworkACLsPerVPCChecker', quota_codes=['L-B4A6D682'])
+registry.register('vpc', r'^Rules per network ACL$', 'vpc_checks.RulesPerNetworkACLChecker', quota_codes=['L-2AEEBF1A'])
+registry.register('vpc', r'^VPC security groups per Region$', 'vpc_checks.SecurityGroupsPerRegionChecker', quota_codes=['L-E79EC296'])
+registry.register('vpc', r'^Inbound or outbound rules per security group$', 'vpc_checks.RulesPerSecurityGroupChecker', quota_codes=['L-0EA8095F'])
+registry.register('vpc', r'^Security groups per network interface$', 'vpc_checks.SecurityGroupsPerNetworkInterfaceChecker', quota_codes=['L-2AFB9258'])
+
+registry.register('workspaces', r'^GraphicsPro WorkSpaces$', 'workspaces_checks.WorkspacesChecker')
+registry.register('workspaces', r'^Standby WorkSpaces$', 'workspaces_checks.WorkspacesChecker')
+registry.register('workspaces', r'^WorkSpaces$', 'workspaces_checks.WorkspacesChecker')
+registry.register('workspaces', r'^Images$', 'workspaces_checks.WorkspacesImagesChecker')
+
+registry.register('route53', r'^Hosted zones$', 'route53_checks.HostedZonesChecker', quota_codes=['L-4EA4796A'])
+registry.register('route53', r'^Health checks$', 'route53_checks.HealthChecksChecker', quota_codes=['L-ACB674F3'])
+
+# How far back to look for the latest usage metric datapoint (in minutes)
+METRIC_LOOKBACK_MINUTES = int(os.environ.get('SERVICE_QUOTA_METRIC_LOOKBACK_MINUTES', 10))
+
+# How long the list_services / list_service_quotas metadata is cached (in hours)
+CATALOG_TTL_HOURS = float(os.environ.get('SERVICE_QUOTA_CATALOG_TTL_HOURS', 168))
+
+# Low, flat usage quotas are re-checked at most every SCHEDULE_MAX_INTERVAL runs,
+# and every quota is checked every SCHEDULE_FULL_SWEEP_RUNS runs
+SCHEDULE_MAX_INTERVAL = int(os.environ.get('SERVICE_QUOTA_SCHEDULE_MAX_INTERVAL', 7))
+SCHEDULE_FULL_SWEEP_RUNS = int(os.environ.get('SERVICE_QUOTA_SCHEDULE_FULL_SWEEP_RUNS', 7))
+
+# Number of regions checked in parallel
+REGION_CONCURRENCY = int(os.environ.get('SERVICE_QUOTA_REGION_CONCURRENCY', 4))
+
+# When set, every active account in the organization is checked by assuming this role in it
+MEMBER_ROLE_NAME = os.environ.get('SERVICE_QUOTA_MEMBER_ROLE_NAME')
+
+# Number of account and region pairs checked in parallel when checking an organization
+ACCOUNT_CONCURRENCY = int(os.environ.get('SERVICE_QUOTA_ACCOUNT_CONCURRENCY', 8))
+
+# When enabled the scheduled invocation only splits the run into shards and invokes itself once per
+# shard, the last worker to finish merges the results and publishes them
+SHARDING = os.environ.get('SERVICE_QUOTA_SHARDING', '').lower() == 'true'
+
+# Number of CloudWatch only services bundled into one shard
+SHARD_SERVICE_GROUP_SIZE = int(os.environ.get('SERVICE_QUOTA_SHARD_SERVICE_GROUP_SIZE', 25))
+
+# Progress is checkpointed and the run continued in a new invocation once less than this many
+# seconds remain before the Lambda timeout (requires SERVICE_QUOTA_STATE_URI)
+CHECKPOINT_MARGIN_SECONDS = int(os.environ.get('SERVICE_QUOTA_CHECKPOINT_MARGIN_SECONDS', 120))
+
+# Upper bound on continuation invocations, the partial results are published once it is reached
+MAX_RESUMES = int(os.environ.get('SERVICE_QUOTA_MAX_RESUMES', 10))
+
+# "threads" checks the quotas of a region one after another, "asyncio" runs the checkers of a region
+# concurrently on one event loop, ASYNC_BATCH_SIZE at a time between checkpoints
+ENGINE = os.environ.get('SERVICE_QUOTA_ENGINE', 'threads')
+ASYNC_BATCH_SIZE = int(os.environ.get('SERVICE_QUOTA_ASYNC_BATCH_SIZE', 64))
 
 def handler(event, context):
+    # API call telemetry covers one invocation
+    telemetry.reset()
+    utilization_metrics.reset()
+    result = dispatch(event or {}, context)
+
+    # every usage computed in this invocation, whether or not it is above the threshold
+    if utilization_metrics.ENABLED:
+        utilization_metrics.emit()
+
+    if telemetry.ENABLED:
+        summary = telemetry.emit()
+        # a dry run returns its plans keyed by region (and account), the summary only goes out as embedded metrics there
+        if not (event or {}).get('dry_run'):
+            result = {**(result or {}), 'telemetry': summary}
+
+    return result
+
+def dispatch(event, context):
     regions = os.environ['SERVICE_QUOTA_REGION_LIST'].split(',')
 
-    results = {}
-    for region in regions:
-        region_results = check_quotas_in_region(region)
-        if region_results:
-            results[region] = region_results
+    if event.get('mode') == 'worker':
+        return run_shard(event)
+
+    # invocation record sent to the on-failure destination once an asynchronous invocation gave up
+    if 'requestPayload' in event and 'requestContext' in event:
+        return record_failed_invocation(event)
+
+    # a dry run only reports what would be checked, without reading any usage
+    if event.get('dry_run'):
+        plans = run_accounts(plan_quotas_in_region, regions) if MEMBER_ROLE_NAME else plan_regions(regions)
+        logger.info(json.dumps(plans))
+        return plans
+
+    if SHARDING:
+        return coordinate(regions, sharding.LambdaOrchestrator(os.environ['AWS_LAMBDA_FUNCTION_NAME']))
+
+    store = state_store.get_store()
+    if store and context is not None:
+        return run_with_checkpoints(event, context, regions, store)
+
+    # API responses are only shared within a run
+    api_cache.reset()
+    run_cache.reset()
+    if MEMBER_ROLE_NAME:
+        results = run_accounts(check_quotas_in_region, regions)
+    else:
+        results = check_regions(regions)
+    logger.info(f"API cache: {json.dumps(api_cache.stats())}")
+    logger.info(f"Client pool: {json.dumps(clients.stats())}")
+
+    publish_results(results)
+
+    return
+
+def run_with_checkpoints(event, context, regions, store):
+    if event.get('mode') == 'resume':
+        run_id = event['run_id']
+        state = store.get(f"runs/{run_id}/checkpoint")
+        state['invocation'] += 1
+    else:
+        run_id = uuid.uuid4().hex
+        state = {'invocation': 0, 'progress': {}}
+
+    deadline = checkpoint.Deadline(context, CHECKPOINT_MARGIN_SECONDS)
+    progress = state['progress']
+
+    def check(region):
+        # progress is tracked per account and region
+        region_progress = progress.setdefault(state_key('progress', region), checkpoint.new_progress())
+        if region_progress['done']:
+            return region_progress['results']
+        return check_quotas_in_region(region, deadline=deadline, progress=region_progress)
+
+    api_cache.reset()
+    run_cache.reset()
+    if MEMBER_ROLE_NAME:
+        results = run_accounts(check, regions)
+    else:
+        results = check_regions(regions, fn=check)
+    logger.info(f"API cache: {json.dumps(api_cache.stats())}")
+    logger.info(f"Client pool: {json.dumps(clients.stats())}")
+
+    if not all(region_progress['done'] for region_progress in progress.values()):
+        if state['invocation'] < MAX_RESUMES:
+            store.put(f"runs/{run_id}/checkpoint", state)
+            logger.info(f"Continuing run {run_id} in a new invocation")
+            sharding.LambdaOrchestrator(os.environ['AWS_LAMBDA_FUNCTION_NAME']).invoke({'mode': 'resume', 'run_id': run_id})
+            return {'run_id': run_id, 'resumed': True}
+
+        logger.error(f"Run {run_id} did not finish after {MAX_RESUMES} continuations, publishing partial results")
+
+    publish_results(results)
 
+    return {'run_id': run_id, 'resumed': False}
+
+def publish_results(results):
     if results:
         sns_topic_arn = os.environ['SNS_TOPIC_ARN']
-        sns.publish(
+        clients.get_client('sns', None).publish(
             TopicArn=sns_topic_arn,
             Message=json.dumps(results),
             Subject="Service quotas approaching limits"
         )
 
-    return
+def coordinate(regions, orchestrator):
+    store = state_store.get_store()
+    if not store:
+        raise ValueError("Sharding requires SERVICE_QUOTA_STATE_URI to collect the shard results")
+
+    region_services = {}
+    for region in regions:
+        catalog = get_catalog(region)
+        region_services[region] = [service['ServiceCode'] for service in catalog.services() if service['ServiceCode'] not in skip_services]
+        catalog.save()
+
+    account_ids = [account['Id'] for account in accounts.list_member_accounts()] if MEMBER_ROLE_NAME else [None]
+    shards = sharding.build_shards(region_services, registry.services(), SHARD_SERVICE_GROUP_SIZE, account_ids)
+
+    run_id = uuid.uuid4().hex
+    logger.info(f"Starting run {run_id} with {len(shards)} shards")
+    for shard in shards:
+        orchestrator.invoke({'mode': 'worker', 'run_id': run_id, 'shard': shard, 'shard_count': len(shards)})
+
+    return {'run_id': run_id, 'shards': len(shards)}
+
+def run_shard(event):
+    store = state_store.get_store()
+    run_id = event['run_id']
+    shard = event['shard']
+
+    def check(region):
+        return check_quotas_in_region(region, shard['service_codes'])
+
+    api_cache.reset()
+    run_cache.reset()
+    if shard.get('account_id'):
+        results = run_accounts(check, [shard['region']], account_ids=[shard['account_id']]).get(shard['account_id'], {}).get(shard['region'], [])
+    else:
+        results = check(shard['region'])
+
+    store.put(f"runs/{run_id}/shards/{shard['shard_id']}", {'shard': shard, 'results': results})
+    publish_if_complete(store, run_id, event['shard_count'])
+
+    return {'run_id': run_id, 'shard_id': shard['shard_id']}
+
+def record_failed_invocation(event):
+    payload = event['requestPayload']
+    condition = event['requestContext'].get('condition')
+    error = (event.get('responsePayload') or {}).get('errorMessage') or condition
+    if payload.get('mode') != 'worker':
+        logger.error(f"Invocation {json.dumps(payload)} failed ({condition}): {error}")
+        return {'failed': True}
+
+    # a shard that crashed, timed out or never ran still counts as finished, with an error in place of
+    # its results, so the run is published without it instead of not at all
+    store = state_store.get_store()
+    run_id = payload['run_id']
+    shard = payload['shard']
+    logger.error(f"Shard {shard['shard_id']} of run {run_id} failed ({condition}): {error}")
+    services = ', '.join(shard['service_codes'])
+    results = [{'Error': f"Shard {shard['shard_id']} ({services}) failed: {error}"}]
+    store.put_if_absent(f"runs/{run_id}/shards/{shard['shard_id']}", {'shard': shard, 'results': results})
+    publish_if_complete(store, run_id, payload['shard_count'])
+
+    return {'run_id': run_id, 'shard_id': shard['shard_id'], 'failed': True}
+
+def publish_if_complete(store, run_id, shard_count):
+    # the last shard to finish merges and publishes, put_if_absent makes sure only one of them does
+    finished = store.list_keys(f"runs/{run_id}/shards/")
+    if len(finished) >= shard_count and store.put_if_absent(f"runs/{run_id}/published", {'shards': len(finished)}):
+        results = sharding.merge_results(store.get(key) for key in sorted(finished))
+        logger.info(f"Publishing run {run_id} from {len(finished)} shards")
+        publish_results(results)
+
+def check_regions(regions, workers=None, fn=None):
+    return run_regions(fn or check_quotas_in_region, regions, workers)
+
+def plan_regions(regions, workers=None):
+    return run_regions(plan_quotas_in_region, regions, workers)
+
+def run_regions(fn, regions, workers=None):
+    workers = max(1, min(workers or REGION_CONCURRENCY, len(regions)))
+
+    region_results = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # each task gets a copy of the caller's context so it keeps the account being checked
+        futures = {executor.submit(contextvars.copy_context().run, fn, region): region for region in regions}
+        for future in as_completed(futures):
+            region = futures[future]
+            # each region reports its own errors, this keeps one bad region from taking down the rest
+            try:
+                region_results[region] = future.result()
+            except Exception as e:
+                logger.error(f"Error checking {region}: {str(e)}")
+                region_results[region] = [{'Error': f"Error checking {region}: {str(e)}"}]
+
+    # keep the report in the configured region order
+    return {region: region_results[region] for region in regions if region_results.get(region)}
+
+def run_accounts(fn, regions, workers=None, account_ids=None):
+    local_account_id, partition = accounts.caller_identity()
+    if account_ids is None:
+        account_ids = [account['Id'] for account in accounts.list_member_accounts()]
+    tasks = [(account_id, region) for account_id in account_ids for region in regions]
+    workers = max(1, min(workers or ACCOUNT_CONCURRENCY, len(tasks)))
+    remaining = Counter(account_id for account_id, _ in tasks)
+    remaining_lock = threading.Lock()
+
+    def run(account_id, region):
+        # the local account is checked with the Lambda's own credentials
+        if account_id == local_account_id:
+            return fn(region)
+        try:
+            session = accounts.get_session(account_id, MEMBER_ROLE_NAME, partition)
+            with clients.account_scope(account_id, session):
+                return fn(region)
+        finally:
+            with remaining_lock:
+                remaining[account_id] -= 1
+                done = remaining[account_id] == 0
+            if done:
+                release_account(account_id)
+
+    task_results = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(run, account_id, region): (account_id, region) for account_id, region in tasks}
+        for future in as_completed(futures):
+            account_id, region = futures[future]
+            # each account and region reports its own errors, one bad member account doesn't stop the rest
+            try:
+                task_results[(account_id, region)] = future.result()
+            except Exception as e:
+                logger.error(f"Error checking {account_id} in {region}: {str(e)}")
+                task_results[(account_id, region)] = [{'Error': f"Error checking {account_id} in {region}: {str(e)}"}]
+
+    results = {}
+    for account_id, region in tasks:
+        if task_results.get((account_id, region)):
+            results.setdefault(account_id, {})[region] = task_results[(account_id, region)]
+    return results
 
-def check_quotas_in_region(region):
-    quota_client = boto3.client('service-quotas', region_name=region, config=BOTO_CONFIG)
-    ec2_client = boto3.client('ec2', region_name=region, config=BOTO_CONFIG)
+# the clients, session and cached responses of a member account are dropped once all its regions are
+# checked, so memory doesn't grow with the size of the organization
+def release_account(account_id):
+    clients.release_account(account_id)
+    accounts.release_session(account_id, MEMBER_ROLE_NAME)
+    api_cache.release_scope(account_id)
+    run_cache.release_account(account_id)
+
+def state_key(name, region):
+    account_id = clients.current_account_id()
+    return f"{name}/{account_id}/{region}" if account_id else f"{name}/{region}"
+
+# shards of the same region run at the same time and each writes its state documents back whole, so
+# every shard keeps its own copy keyed by its services instead of overwriting the others'
+def shard_state_key(name, region, service_codes=None):
+    key = state_key(name, region)
+    if service_codes is not None:
+        key += f"/{zlib.crc32(','.join(sorted(service_codes)).encode()):08x}"
+    return key
+
+def get_catalog(region, service_codes=None):
+    quota_client = clients.get_client('service-quotas', region)
+    return quota_catalog.QuotaCatalog(
+        quota_client,
+        region,
+        list_all_services,
+        list_all_service_quotas,
+        store=state_store.get_store(),
+        ttl_seconds=CATALOG_TTL_HOURS * 3600,
+        cache_key=shard_state_key('quota-catalog', region, service_codes)
+    )
+
+def get_scheduler(region, threshold, service_codes=None, run=None):
+    return scheduler.UsageScheduler(
+        region,
+        threshold,
+        store=state_store.get_store(),
+        max_interval=SCHEDULE_MAX_INTERVAL,
+        full_sweep_runs=SCHEDULE_FULL_SWEEP_RUNS,
+        cache_key=shard_state_key('usage-history', region, service_codes),
+        run=run
+    )
+
+def build_plan(region, catalog, usage_scheduler=None, service_codes=None):
+    return planner.build_plan(region, catalog, registry, skip_services, quota_name_exclusions, METRIC_LOOKBACK_MINUTES, usage_scheduler, service_codes)
+
+def plan_quotas_in_region(region):
+    threshold = float(os.environ['SERVICE_QUOTA_THRESHOLD']) / 100
+    catalog = get_catalog(region)
+    summary = build_plan(region, catalog, get_scheduler(region, threshold)).summary()
+    catalog.save()
+    return summary
 
+def check_quotas_in_region(region, service_codes=None, deadline=None, progress=None):
     threshold = float(os.environ['SERVICE_QUOTA_THRESHOLD']) / 100
+    progress = progress if progress is not None else checkpoint.new_progress()
 
-    results = []
+    catalog = get_catalog(region, service_codes)
+    usage_scheduler = get_scheduler(region, threshold, service_codes, progress['scheduler_run'])
+    progress['scheduler_run'] = usage_scheduler.run
 
     try:
-        for service in list_all_services(quota_client):
-            service_code = service['ServiceCode']
-
-            logger.debug(f"Checking service {service_code} in {region}")
-            for quota in list_all_service_quotas(quota_client, service_code):
-
-                if service_code == 's3':
-                    logger.debug(f"Checking quota {quota['QuotaName']} for service {service_code} in {region}")
-
-                # Skip hard limits here, we may want to manually check key hard limits separately
-                # But there are too many for meaningful querying
-                if quota['Adjustable'] == True and not any(exclusion in quota['QuotaName'].lower() for exclusion in quota_name_exclusions):
-                    usage = get_quota_usage(quota, service_code, region)
-                    limit = quota['Value']
-
-                    if usage and limit > 0 and usage / limit >= threshold:
-                        logger.info(f"Service {service['ServiceName']} has {usage} of {limit} ({usage / limit * 100}%) which is approaching the limit")
-                        results.append({
-                            'ServiceName': service['ServiceName'],
-                            'QuotaName': quota['QuotaName'],
-                            'Usage': usage,
-                            'Limit': limit,
-                            'Percentage': (usage / limit) * 100
-                        })
+        plan = build_plan(region, catalog, usage_scheduler, service_codes)
+        logger.debug(f"Plan for {region}: {json.dumps(plan.summary())}")
+        execute_plan(plan, catalog, threshold, usage_scheduler, deadline, progress)
     except Exception as e:
         logger.error(f"Error checking {region}: {str(e)}")
-        results.append({
+        progress['results'].append({
             'Error': f"Error checking {region}: {str(e)}"
         })
+        progress['done'] = True
+
+    catalog.save()
+    usage_scheduler.save()
+
+    return progress['results']
+
+def execute_plan(plan, catalog, threshold, usage_scheduler=None, deadline=None, progress=None):
+    progress = progress if progress is not None else checkpoint.new_progress()
+    results = progress['results']
+
+    def evaluate(service, quota, usage):
+        limit = quota['Value']
+        if usage_scheduler:
+            usage_scheduler.record(quota, usage, limit)
+
+        if usage and limit > 0 and usage / limit >= threshold:
+            limit = catalog.current_value(quota)
+
+        utilization_metrics.record(clients.current_account_id(), plan.region, service, quota, usage, limit)
 
+        if usage and limit > 0 and usage / limit >= threshold:
+            logger.info(f"Service {service['ServiceName']} has {usage} of {limit} ({usage / limit * 100}%) which is approaching the limit")
+            results.append({
+                'ServiceName': service['ServiceName'],
+                'QuotaName': quota['QuotaName'],
+                'Usage': usage,
+                'Limit': limit,
+                'Percentage': (usage / limit) * 100
+            })
+
+    if plan.metric_items and not progress['metrics_done']:
+        plan.metrics.resolve(clients.get_client('cloudwatch', plan.region))
+        for service, quota, metric_key in plan.metric_items:
+            evaluate(service, quota, plan.metrics.get_value(metric_key))
+    progress['metrics_done'] = True
+
+    items = [item for item in plan.ordered_checker_items() if not checkpoint.is_checked(progress, item[3])]
+    batch_size = ASYNC_BATCH_SIZE if ENGINE == 'asyncio' else 1
+
+    for start in range(0, len(items), batch_size):
+        if deadline and deadline.expired():
+            return results
+
+        batch = items[start:start + batch_size]
+        if ENGINE == 'asyncio':
+            usages = async_engine.get_engine().run(get_checker_usages_async(batch, plan.region))
+        else:
+            usages = [get_checker_usage(checker, quota, plan.region) for _, quota, checker, _ in batch]
+
+        # evaluated in order so the cursor only moves past quotas that were checked
+        for (service, quota, checker, position), usage in zip(batch, usages):
+            evaluate(service, quota, usage)
+            progress['cursor'] = list(position)
+
+    progress['done'] = True
     return results
 
 def list_all_services(client):
     services = []
     paginator = client.get_paginator('list_services')
     for page in paginator.paginate():
-        for service in page['Services']:
-            if service['ServiceCode'] not in skip_services:
-                services.append(service)
-        time.sleep(API_RATE_LIMIT_DELAY)
+        services.extend(page['Services'])
     return services
 
 def list_all_service_quotas(client, service_code):
@@ -336,96 +674,37 @@ def list_all_service_quotas(client, service_code):
     paginator = client.get_paginator('list_service_quotas')
     for page in paginator.paginate(ServiceCode=service_code):
         quotas.extend(page['Quotas'])
-        time.sleep(API_RATE_LIMIT_DELAY)
     return quotas
 
-def get_quota_usage(quota, service_code, region):
-    if 'UsageMetric' in quota:
-        value = get_cloudwatch_metric_value(boto3.client('cloudwatch', region_name=region), quota['UsageMetric'])
-        return value
-    else:
-        return get_service_specific_usage(service_code, quota, region)
-
-def get_cloudwatch_metric_value(cloudwatch_client, usage_metric):
+def get_checker_usage(checker, quota, region):
     try:
-        dimensions = []
-        if 'MetricDimensions' in usage_metric and isinstance(usage_metric['MetricDimensions'], list):
-            for dim in usage_metric['MetricDimensions']:
-                if isinstance(dim, dict) and 'Name' in dim and 'Value' in dim:
-                    dimensions.append({'Name': dim['Name'], 'Value': dim['Value']})
-
-        response = cloudwatch_client.get_metric_statistics(
-            Namespace=usage_metric['MetricNamespace'],
-            MetricName=usage_metric['MetricName'],
-            Dimensions=dimensions,
-            StartTime=datetime.utcnow() - timedelta(minutes=10),
-            EndTime=datetime.utcnow(),
-            Period=300,
-            Statistics=[usage_metric.get('MetricStatisticRecommendation', 'Maximum')]
-        )
-
-        # this will typically be no data
-        if response['Datapoints']:
-            logger.debug(f"Getting cloudwatch metric value for {usage_metric['MetricNamespace']} - {usage_metric['MetricName']}")
-            return response['Datapoints'][0]['Maximum']
-        else:
-            return None
+        logger.debug(f"Getting service specific usage for {quota['QuotaName']} - {quota['ServiceCode']}")
+        return checker.get_usage(region, quota['QuotaName'])
     except Exception as e:
-        print(f"Error getting metric value: {str(e)}")
-        return None
-
-def get_service_specific_usage(service_code, quota, region):
-
-    if service_code == 'cloudformation':
-        logger.debug(f"Getting service specific usage for {quota['QuotaName']} - {service_code}")
-        return get_service_usage(cloudformation_registry, quota['QuotaName'], region)
-    elif service_code == 'ebs':
-        logger.debug(f"Getting service specific usage for {quota['QuotaName']} - {service_code}")
-        return get_service_usage(ebs_registry, quota['QuotaName'], region)
-    elif service_code == 'ec2':
-        logger.debug(f"Getting service specific usage for {quota['QuotaName']} - {service_code}")
-        return get_service_usage(ec2_registry, quota['QuotaName'], region)
-    elif service_code == 'efs':
-        logger.debug(f"Getting service specific usage for {quota['QuotaName']} - {service_code}")
-        return get_service_usage(efs_registry, quota['QuotaName'], region)
-    elif service_code == 'eks':
-        logger.debug(f"Getting service specific usage for {quota['QuotaName']} - {service_code}")
-        return get_service_usage(eks_registry, quota['QuotaName'], region)
-    elif service_code == 'es':
-        logger.debug(f"Getting service specific usage for {quota['QuotaName']} - {service_code}")
-        return get_service_usage(es_registry, quota['QuotaName'], region)
-    elif service_code == 'rds':
-        logger.debug(f"Getting service specific usage for {quota['QuotaName']} - {service_code}")
-        return get_service_usage(rds_registry, quota['QuotaName'], region)
-    elif service_code == 'route53':
-        logger.debug(f"Getting service specific usage for {quota['QuotaName']} - {service_code}")
-        return get_service_usage(route53_registry, quota['QuotaName'], region)
-    elif service_code == 'vpc':
-        logger.debug(f"Getting service specific usage for {quota['QuotaName']} - {service_code}")
-        return get_service_usage(vpc_registry, quota['QuotaName'], region)
-    elif service_code == 'workspaces':
-        logger.debug(f"Getting service specific usage for {quota['QuotaName']} - {service_code}")
-        return get_service_usage(workspaces_registry, quota['QuotaName'], region)
-    else:
-        logger.debug(f"Unsupported service - {quota['QuotaName']} - {service_code}")
+        logger.error(f"Error getting usage: {str(e)}")
         return None
 
-def get_service_usage(registry, quota_name, region):
+async def get_checker_usages_async(items, region):
+    engine = async_engine.get_engine()
 
-    try:
-        checker = registry.get_checker(quota_name)
-        if checker:
-            return checker.get_usage(region, quota_name)
-        else:
-            logger.debug(f"No checker found for {quota_name}")
+    async def get_usage(checker, quota):
+        try:
+            logger.debug(f"Getting service specific usage for {quota['QuotaName']} - {quota['ServiceCode']}")
+            return await engine.get_usage(checker, region, quota['QuotaName'])
+        except Exception as e:
+            logger.error(f"Error getting usage: {str(e)}")
             return None
-    except Exception as e:
-        logger.error(f"Error getting usage: {str(e)}")
-        return None
+
+    return await asyncio.gather(*(get_usage(checker, quota) for _, quota, checker, _ in items))
+
 # For local testing
 if __name__ == "__main__":
+    import sys
     os.environ['SERVICE_QUOTA_REGION_LIST'] = 'us-east-1'
     os.environ['SERVICE_QUOTA_THRESHOLD'] = '20'
-    print(handler({}, None))
-    print(handler({}, None))
-    print(handler({}, None))
+    if '--dry-run' in sys.argv:
+        print(json.dumps(handler({'dry_run': True}, None), indent=2))
+    else:
+        print(handler({}, None))
+        print(handler({}, None))
+        print(handler({}, None))
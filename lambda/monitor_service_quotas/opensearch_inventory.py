@@ -0,0 +1,49 @@
+import asyncio
+import clients
+import run_cache
+
+# describe_domains accepts at most this many domain names per call
+DESCRIBE_BATCH_SIZE = 5
+
+# Domains of a region and their node counts, built once per run for every es quota. Domains are
+# listed once and described DESCRIBE_BATCH_SIZE at a time on the OpenSearch API, with the batches
+# running concurrently, so N domains take N / 5 + 1 calls instead of N + 1.
+class OpenSearchInventory:
+    def __init__(self, instance_counts):
+        # domain name: number of instances
+        self.instance_counts = instance_counts
+
+    def domain_count(self):
+        return len(self.instance_counts)
+
+    def max_instances_per_domain(self):
+        return max(self.instance_counts.values(), default=0)
+
+def instance_count(cluster_config):
+    # data nodes, dedicated master nodes, UltraWarm nodes and any other enabled node types
+    count = cluster_config.get('InstanceCount', 0)
+    if cluster_config.get('DedicatedMasterEnabled'):
+        count += cluster_config.get('DedicatedMasterCount', 0)
+    if cluster_config.get('WarmEnabled'):
+        count += cluster_config.get('WarmCount', 0)
+    for node_option in cluster_config.get('NodeOptions', []):
+        node_config = node_option.get('NodeConfig', {})
+        if node_config.get('Enabled'):
+            count += node_config.get('Count', 0)
+    return count
+
+async def build_async(engine, region):
+    opensearch = engine.client(clients.get_client('opensearch', region))
+    domain_names = [domain['DomainName'] for domain in await opensearch.paginate('list_domain_names', 'DomainNames')]
+
+    responses = await asyncio.gather(*(
+        opensearch.describe_domains(DomainNames=domain_names[start:start + DESCRIBE_BATCH_SIZE])
+        for start in range(0, len(domain_names), DESCRIBE_BATCH_SIZE)
+    ))
+    return OpenSearchInventory({
+        domain['DomainName']: instance_count(domain['ClusterConfig'])
+        for response in responses for domain in response['DomainStatusList']
+    })
+
+async def get_async(engine, region):
+    return await run_cache.get_async('opensearch-inventory', region, lambda: build_async(engine, region))
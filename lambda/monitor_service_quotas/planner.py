@@ -0,0 +1,79 @@
+import logging
+import math
+import re
+import usage_metrics
+
+logger = logging.getLogger(__name__)
+
+# The quotas of a region that can actually produce a usage value, grouped by where the usage comes from
+class RegionPlan:
+    def __init__(self, region, metric_lookback_minutes=10):
+        self.region = region
+        self.metrics = usage_metrics.UsageMetricResolver(lookback_minutes=metric_lookback_minutes)
+        self.metric_items = []
+        self.checker_items = {}
+        self.counts = {
+            'services': 0,
+            'quotas': 0,
+            'hard_limits': 0,
+            'excluded': 0,
+            'no_usage_source': 0,
+            'deferred': 0
+        }
+
+    def add_metric(self, service, quota):
+        self.metric_items.append((service, quota, self.metrics.add(quota['UsageMetric'])))
+
+    def add_checker(self, service, quota, checker, position):
+        self.checker_items.setdefault(type(checker).__name__, []).append((service, quota, checker, position))
+
+    def ordered_checker_items(self):
+        # checkpoints resume from a (service code, quota index) cursor, so execution follows catalog order
+        return sorted((item for items in self.checker_items.values() for item in items), key=lambda item: item[3])
+
+    def checker_count(self):
+        return sum(len(items) for items in self.checker_items.values())
+
+    def summary(self):
+        return {
+            **self.counts,
+            'cloudwatch_quotas': len(self.metric_items),
+            'cloudwatch_metrics': len(self.metrics),
+            'cloudwatch_batches': math.ceil(len(self.metrics) / usage_metrics.MAX_QUERIES_PER_REQUEST),
+            'checker_quotas': self.checker_count(),
+            'checkers': {name: len(items) for name, items in sorted(self.checker_items.items())}
+        }
+
+def build_plan(region, catalog, registry, skip_services, quota_name_exclusions, metric_lookback_minutes=10, scheduler=None, service_codes=None):
+    plan = RegionPlan(region, metric_lookback_minutes)
+    exclusions = re.compile('|'.join(re.escape(exclusion) for exclusion in quota_name_exclusions))
+
+    for service in catalog.services():
+        service_code = service['ServiceCode']
+        if service_code in skip_services or (service_codes is not None and service_code not in service_codes):
+            continue
+
+        plan.counts['services'] += 1
+        logger.debug(f"Planning service {service_code} in {region}")
+        for index, quota in enumerate(catalog.quotas(service_code)):
+            plan.counts['quotas'] += 1
+
+            # Skip hard limits here, we may want to manually check key hard limits separately
+            # But there are too many for meaningful querying
+            if quota['Adjustable'] != True:
+                plan.counts['hard_limits'] += 1
+            elif exclusions.search(quota['QuotaName'].lower()):
+                plan.counts['excluded'] += 1
+            elif 'UsageMetric' in quota:
+                plan.add_metric(service, quota)
+            else:
+                checker = registry.get_checker(service_code, quota.get('QuotaCode'), quota['QuotaName'])
+                # usage metrics are read in bulk and cost next to nothing, only checkers are scheduled
+                if checker and scheduler and not scheduler.is_due(quota):
+                    plan.counts['deferred'] += 1
+                elif checker:
+                    plan.add_checker(service, quota, checker, (service_code, index))
+                else:
+                    plan.counts['no_usage_source'] += 1
+
+    return plan
@@ -0,0 +1,94 @@
+import logging
+import threading
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# Only the fields the quota checks read are kept in the catalog
+QUOTA_FIELDS = ['ServiceCode', 'ServiceName', 'QuotaCode', 'QuotaName', 'Value', 'Adjustable', 'UsageMetric']
+
+# Tier one: survives warm Lambda invocations
+_memory = {}
+_memory_lock = threading.Lock()
+
+# Caches the list_services / list_service_quotas metadata for a region.
+#
+# Every entry (the service list and each service's quotas) carries its own fetch time and is
+# refreshed on its own once it expires, so a run only re-lists the services whose entries are
+# stale instead of the whole catalog. Entries are read from the in-process cache first, then from
+# the persistent state store, and only then from the service quotas API.
+class QuotaCatalog:
+
+    def __init__(self, quota_client, region, list_services, list_service_quotas, store=None, ttl_seconds=604800, cache_key=None):
+        self.quota_client = quota_client
+        self.list_services = list_services
+        self.list_service_quotas = list_service_quotas
+        self.region = region
+        self.store = store
+        self.ttl_seconds = ttl_seconds
+        self.cache_key = cache_key or f"quota-catalog/{region}"
+        self.refreshed = set()
+        self._dirty = False
+        self._catalog = self._load()
+
+    def _load(self):
+        with _memory_lock:
+            catalog = _memory.get(self.cache_key)
+        if catalog is None and self.store:
+            try:
+                catalog = self.store.get(self.cache_key)
+            except Exception as e:
+                logger.error(f"Error loading quota catalog for {self.region}: {str(e)}")
+        return catalog or {'services': None, 'quotas': {}}
+
+    def _is_fresh(self, entry, name):
+        if not entry:
+            return False
+        # spread the expiry of the individual entries so they don't all refresh on the same run, the
+        # jitter only ever extends the TTL so an entry is never stale before the next scheduled run
+        jitter = (zlib.crc32(name.encode()) % 1000) / 1000 * 0.2 * self.ttl_seconds
+        return time.time() - entry['fetched_at'] < self.ttl_seconds + jitter
+
+    def services(self):
+        entry = self._catalog['services']
+        if not self._is_fresh(entry, 'services'):
+            entry = {'fetched_at': time.time(), 'items': self.list_services(self.quota_client)}
+            self._catalog['services'] = entry
+            self._dirty = True
+        return entry['items']
+
+    def quotas(self, service_code):
+        entry = self._catalog['quotas'].get(service_code)
+        if not self._is_fresh(entry, service_code):
+            quotas = self.list_service_quotas(self.quota_client, service_code)
+            entry = {'fetched_at': time.time(), 'items': [{field: quota[field] for field in QUOTA_FIELDS if field in quota} for quota in quotas]}
+            self._catalog['quotas'][service_code] = entry
+            self.refreshed.add(service_code)
+            self._dirty = True
+        return entry['items']
+
+    def current_value(self, quota):
+        # a cached limit may have been raised since it was listed, confirm it before alerting on it
+        if quota['ServiceCode'] in self.refreshed or (quota['ServiceCode'], quota['QuotaCode']) in self.refreshed:
+            return quota['Value']
+
+        try:
+            response = self.quota_client.get_service_quota(ServiceCode=quota['ServiceCode'], QuotaCode=quota['QuotaCode'])
+            quota['Value'] = response['Quota']['Value']
+            self.refreshed.add((quota['ServiceCode'], quota['QuotaCode']))
+            self._dirty = True
+        except Exception as e:
+            logger.error(f"Error refreshing {quota['QuotaName']} in {self.region}: {str(e)}")
+        return quota['Value']
+
+    def save(self):
+        with _memory_lock:
+            _memory[self.cache_key] = self._catalog
+
+        if self._dirty and self.store:
+            try:
+                self.store.put(self.cache_key, self._catalog)
+                self._dirty = False
+            except Exception as e:
+                logger.error(f"Error saving quota catalog for {self.region}: {str(e)}")
@@ -0,0 +1,127 @@
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# Requests per second and burst size per service, overridable with SERVICE_QUOTA_API_RATES
+# (e.g. "ec2=20:100,service-quotas=5:10")
+DEFAULT_RATES = {
+    'cloudformation': (5, 10),
+    'cloudwatch': (20, 40),
+    'ec2': (20, 100),
+    'efs': (10, 20),
+    'eks': (10, 20),
+    'es': (5, 10),
+    'opensearch': (5, 10),
+    'rds': (10, 20),
+    'route53': (5, 5),
+    'service-quotas': (5, 10),
+    'workspaces': (5, 10),
+}
+DEFAULT_RATE = (10, 20)
+
+THROTTLE_ERROR_CODES = {
+    'BandwidthLimitExceeded',
+    'EC2ThrottledException',
+    'LimitExceededException',
+    'PriorRequestNotComplete',
+    'ProvisionedThroughputExceededException',
+    'RequestLimitExceeded',
+    'RequestThrottled',
+    'RequestThrottledException',
+    'SlowDown',
+    'ThrottledException',
+    'Throttling',
+    'ThrottlingException',
+    'TooManyRequestsException',
+}
+
+# rate never drops below this fraction of the configured rate when backing off
+MIN_RATE_FRACTION = 0.05
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.throttles = 0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def throttled(self):
+        # multiplicative decrease, and drain the bucket so callers pause right away
+        with self._lock:
+            self.throttles += 1
+            self.rate = max(self.max_rate * MIN_RATE_FRACTION, self.rate / 2)
+            self.tokens = min(self.tokens, 0)
+
+    def succeeded(self):
+        # additive increase back towards the configured rate
+        if self.rate < self.max_rate:
+            with self._lock:
+                self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+def parse_rates(value):
+    rates = {}
+    for item in filter(None, (part.strip() for part in (value or '').split(','))):
+        service, _, limits = item.partition('=')
+        rate, _, burst = limits.partition(':')
+        rates[service.strip()] = (float(rate), float(burst or rate))
+    return rates
+
+_rates = {**DEFAULT_RATES, **parse_rates(os.environ.get('SERVICE_QUOTA_API_RATES'))}
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+def get_bucket(service_name, endpoint, scope=None):
+    key = (service_name, endpoint, scope)
+    with _buckets_lock:
+        if key not in _buckets:
+            rate, burst = _rates.get(service_name, DEFAULT_RATE)
+            _buckets[key] = TokenBucket(rate, burst)
+        return _buckets[key]
+
+def attach(client, scope=None):
+    service_name = client.meta.service_model.service_name
+
+    # buckets are keyed by endpoint host (and account, AWS limits are per account) so clients for
+    # the same service and region, and global endpoints such as route53, share a limit
+    def before_send(request, **kwargs):
+        get_bucket(service_name, urlsplit(request.url).netloc, scope).acquire()
+
+    def needs_retry(response=None, request_dict=None, **kwargs):
+        if response is None or request_dict is None:
+            return None
+
+        parsed = response[1]
+        error_code = parsed.get('Error', {}).get('Code')
+        bucket = get_bucket(service_name, urlsplit(request_dict['url']).netloc, scope)
+        if error_code in THROTTLE_ERROR_CODES:
+            logger.debug(f"Throttled by {service_name} ({error_code}), backing off")
+            bucket.throttled()
+        elif not error_code:
+            bucket.succeeded()
+        return None
+
+    client.meta.events.register('before-send', before_send)
+    client.meta.events.register('needs-retry', needs_retry)
+    return client
@@ -0,0 +1,144 @@
+# One-pass reductions over AWS listings.
+#
+#   reducers.reduce(ec2, 'describe_subnets', 'Subnets', reducers.MaxCountBy('VpcId'))
+#
+# Pages are streamed at the largest page size the operation accepts and folded into the reducer as
+# they arrive, so memory stays constant however many items there are. Operations without a
+# paginator return everything in one response and are reduced the same way.
+
+# Largest page size per (service, operation), operations not listed use the service default
+MAX_PAGE_SIZES = {
+    ('cloudformation', 'list_stack_instances'): 100,
+    ('cloudformation', 'list_stack_sets'): 100,
+    ('ec2', 'describe_client_vpn_endpoints'): 1000,
+    ('ec2', 'describe_client_vpn_routes'): 1000,
+    ('ec2', 'describe_hosts'): 500,
+    ('ec2', 'describe_images'): 1000,
+    ('ec2', 'describe_instance_types'): 100,
+    ('ec2', 'describe_instances'): 1000,
+    ('ec2', 'describe_internet_gateways'): 1000,
+    ('ec2', 'describe_nat_gateways'): 1000,
+    ('ec2', 'describe_network_acls'): 1000,
+    ('ec2', 'describe_network_interfaces'): 1000,
+    ('ec2', 'describe_route_tables'): 100,
+    ('ec2', 'describe_security_groups'): 1000,
+    ('ec2', 'describe_snapshots'): 1000,
+    ('ec2', 'describe_subnets'): 1000,
+    ('ec2', 'describe_transit_gateway_attachments'): 1000,
+    ('ec2', 'describe_transit_gateway_multicast_domains'): 1000,
+    ('ec2', 'describe_transit_gateway_route_tables'): 1000,
+    ('ec2', 'describe_transit_gateways'): 1000,
+    ('ec2', 'describe_volumes'): 1000,
+    ('ec2', 'describe_vpcs'): 1000,
+    ('ec2', 'get_transit_gateway_multicast_domain_associations'): 1000,
+    ('ec2', 'search_transit_gateway_multicast_groups'): 1000,
+    ('efs', 'describe_file_systems'): 100,
+    ('eks', 'list_clusters'): 100,
+    ('eks', 'list_fargate_profiles'): 100,
+    ('eks', 'list_nodegroups'): 100,
+    ('rds', 'describe_db_cluster_snapshots'): 100,
+    ('rds', 'describe_db_clusters'): 100,
+    ('rds', 'describe_db_instances'): 100,
+    ('rds', 'describe_db_parameter_groups'): 100,
+    ('rds', 'describe_db_snapshots'): 100,
+    ('route53', 'list_health_checks'): 1000,
+    ('route53', 'list_hosted_zones'): 100,
+    ('service-quotas', 'list_service_quotas'): 100,
+    ('service-quotas', 'list_services'): 100,
+    ('workspaces', 'describe_workspace_images'): 25,
+    ('workspaces', 'describe_workspaces'): 25,
+}
+
+def pagination_config(client, operation_name):
+    page_size = MAX_PAGE_SIZES.get((client.meta.service_model.service_name, operation_name))
+    return {'PageSize': page_size} if page_size else {}
+
+def pages(client, operation_name, **kwargs):
+    if not client.can_paginate(operation_name):
+        yield getattr(client, operation_name)(**kwargs)
+        return
+
+    paginator = client.get_paginator(operation_name)
+    yield from paginator.paginate(**kwargs, PaginationConfig=pagination_config(client, operation_name))
+
+def items(client, operation_name, result_key, **kwargs):
+    for page in pages(client, operation_name, **kwargs):
+        yield from page.get(result_key, [])
+
+def reduce(client, operation_name, result_key, reducer, **kwargs):
+    for item in items(client, operation_name, result_key, **kwargs):
+        reducer.add(item)
+    return reducer.result()
+
+def _getter(field):
+    if callable(field):
+        return field
+    return lambda item: item.get(field)
+
+class Count:
+    def __init__(self, where=None):
+        self.where = where
+        self.count = 0
+
+    def add(self, item):
+        if self.where is None or self.where(item):
+            self.count += 1
+
+    def result(self):
+        return self.count
+
+class Sum:
+    def __init__(self, field, where=None):
+        self.get = _getter(field)
+        self.where = where
+        self.total = 0
+
+    def add(self, item):
+        if self.where is None or self.where(item):
+            self.total += self.get(item) or 0
+
+    def result(self):
+        return self.total
+
+class Max:
+    def __init__(self, field, where=None):
+        self.get = _getter(field)
+        self.where = where
+        self.max = 0
+
+    def add(self, item):
+        if self.where is None or self.where(item):
+            self.max = max(self.max, self.get(item) or 0)
+
+    def result(self):
+        return self.max
+
+# Largest number of items sharing a key (e.g. subnets per VPC), memory grows with the number of
+# keys rather than the number of items. Items without a key are skipped.
+class MaxCountBy:
+    def __init__(self, key, where=None):
+        self.get = _getter(key)
+        self.where = where
+        self.counts = {}
+
+    def add(self, item):
+        if self.where is None or self.where(item):
+            key = self.get(item)
+            if key is not None:
+                self.counts[key] = self.counts.get(key, 0) + 1
+
+    def result(self):
+        return max(self.counts.values(), default=0)
+
+# Several reductions over the same pass, e.g. Combine(total=Count(), largest=Max('Size')).result()
+# returns {'total': ..., 'largest': ...}
+class Combine:
+    def __init__(self, **reducers):
+        self.reducers = reducers
+
+    def add(self, item):
+        for reducer in self.reducers.values():
+            reducer.add(item)
+
+    def result(self):
+        return {name: reducer.result() for name, reducer in self.reducers.items()}
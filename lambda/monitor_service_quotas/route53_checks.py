@@ -1,15 +1,12 @@
 from abc import ABC, abstractmethod
-import boto3
+import clients
+import reducers
 
 
 class Route53ClientSingleton:
-    _instances = {}
-
     @classmethod
     def get_client(cls, region):
-        if region not in cls._instances:
-            cls._instances[region] = boto3.client('route53', region_name=region)
-        return cls._instances[region]
+        return clients.get_client('route53', region)
 
 class Route53UsageChecker(ABC):
 
@@ -20,41 +17,9 @@ class Route53UsageChecker(ABC):
 class HostedZonesChecker(Route53UsageChecker):
     def get_usage(self, region, quota_name):
         route53 = Route53ClientSingleton.get_client(region)
-        count = 0
-        next_marker = None
-
-        while True:
-            if next_marker:
-                response = route53.list_hosted_zones(Marker=next_marker)
-            else:
-                response = route53.list_hosted_zones()
-
-            count += len(response['HostedZones'])
-
-            if response['IsTruncated']:
-                next_marker = response['NextMarker']
-            else:
-                break
-
-        return count
+        return reducers.reduce(route53, 'list_hosted_zones', 'HostedZones', reducers.Count())
 
 class HealthChecksChecker(Route53UsageChecker):
     def get_usage(self, region, quota_name):
         route53 = Route53ClientSingleton.get_client(region)
-        count = 0
-        next_marker = None
-
-        while True:
-            if next_marker:
-                response = route53.list_health_checks(Marker=next_marker)
-            else:
-                response = route53.list_health_checks()
-
-            count += len(response['HealthChecks'])
-
-            if 'NextMarker' in response:
-                next_marker = response['NextMarker']
-            else:
-                break
-
-        return count
+        return reducers.reduce(route53, 'list_health_checks', 'HealthChecks', reducers.Count())
@@ -0,0 +1,92 @@
+import asyncio
+import clients
+import threading
+from concurrent.futures import Future
+
+# Results computed once per run and shared by every checker that needs them, keyed by
+# (account, region, name). One describe_instances scan answers every vCPU quota, for example.
+#
+# When several callers ask for the same result at once only the first one builds it, the others
+# wait for it. Failures are not cached, the next caller builds the result itself.
+#
+# Results built on the async engine go through get_async: its waiters await the result instead of
+# blocking a thread, since the builder itself needs the engine's worker threads to make progress.
+class RunCache:
+    def __init__(self):
+        self._results = {}
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self._results = {key: future for key, future in self._results.items() if not future.done()}
+
+    def release_account(self, account_id):
+        with self._lock:
+            self._results = {key: future for key, future in self._results.items() if key[0] != account_id or not future.done()}
+
+    def _claim(self, name, region):
+        key = (clients.current_account_id(), region, name)
+        with self._lock:
+            future = self._results.get(key)
+            if future is None:
+                future = self._results[key] = Future()
+                return key, future, True
+            return key, future, False
+
+    def _settle(self, key, future, result=None, error=None):
+        if error is None:
+            future.set_result(result)
+            return
+        with self._lock:
+            if self._results.get(key) is future:
+                del self._results[key]
+        # waiters retry on any failure of the builder, its cancellation included
+        future.set_exception(error if isinstance(error, Exception) else RuntimeError(f"Building {key[2]} was interrupted"))
+
+    def get(self, name, region, build):
+        while True:
+            key, future, leader = self._claim(name, region)
+            if not leader:
+                try:
+                    return future.result()
+                except Exception:
+                    continue
+
+            try:
+                result = build()
+            except BaseException as e:
+                self._settle(key, future, error=e)
+                raise
+            self._settle(key, future, result)
+            return result
+
+    async def get_async(self, name, region, build_async):
+        while True:
+            key, future, leader = self._claim(name, region)
+            if not leader:
+                try:
+                    return await asyncio.wrap_future(future)
+                except Exception:
+                    continue
+
+            try:
+                result = await build_async()
+            except BaseException as e:
+                self._settle(key, future, error=e)
+                raise
+            self._settle(key, future, result)
+            return result
+
+_cache = RunCache()
+
+def get(name, region, build):
+    return _cache.get(name, region, build)
+
+async def get_async(name, region, build_async):
+    return await _cache.get_async(name, region, build_async)
+
+def reset():
+    _cache.reset()
+
+def release_account(account_id):
+    _cache.release_account(account_id)
@@ -0,0 +1,106 @@
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# number of utilization samples kept per quota
+MAX_SAMPLES = 8
+
+# quotas at or above this fraction of the alert threshold are checked on every run
+HOT_FRACTION = 0.5
+
+# a quota is re-checked at least twice before its projected growth could reach the threshold
+SAFETY_FACTOR = 2
+
+# Tier one: survives warm Lambda invocations
+_memory = {}
+_memory_lock = threading.Lock()
+
+# Decides how often each quota needs to be re-measured from its recent utilization history.
+#
+# Quotas close to the threshold or growing towards it are checked on every run, flat low usage
+# quotas every few runs (up to max_interval), and every quota is checked on a full sweep every
+# full_sweep_runs runs. Quotas without history, or whose last check failed, are always due.
+class UsageScheduler:
+
+    def __init__(self, region, threshold, store=None, max_interval=7, full_sweep_runs=7, cache_key=None, run=None):
+        self.region = region
+        self.threshold = threshold
+        self.store = store
+        self.max_interval = max(1, max_interval)
+        self.full_sweep_runs = max(1, full_sweep_runs)
+        self.cache_key = cache_key or f"usage-history/{region}"
+        self._history = self._load()
+        # a resumed run keeps the run number it started with
+        self.run = run or self._history['run'] + 1
+
+    def _load(self):
+        with _memory_lock:
+            history = _memory.get(self.cache_key)
+        if history is None and self.store:
+            try:
+                history = self.store.get(self.cache_key)
+            except Exception as e:
+                logger.error(f"Error loading usage history for {self.region}: {str(e)}")
+        return history or {'run': 0, 'quotas': {}}
+
+    @staticmethod
+    def _key(quota):
+        return f"{quota['ServiceCode']}/{quota.get('QuotaCode') or quota['QuotaName']}"
+
+    def full_sweep(self):
+        return self.run % self.full_sweep_runs == 0
+
+    def is_due(self, quota):
+        entry = self._history['quotas'].get(self._key(quota))
+        if not entry or not entry['samples'] or self.full_sweep():
+            return True
+        return self.run - entry['last_run'] >= self.interval(entry['samples'])
+
+    def interval(self, samples):
+        utilization = samples[-1][1]
+        # a second sample is needed before the growth rate is known
+        if len(samples) < 2 or utilization >= self.threshold * HOT_FRACTION:
+            return 1
+
+        growth = self._growth_per_run(samples)
+        if growth <= 0:
+            return self.max_interval
+
+        runs_to_threshold = (self.threshold - utilization) / growth
+        return max(1, min(self.max_interval, math.floor(runs_to_threshold / SAFETY_FACTOR)))
+
+    @staticmethod
+    def _growth_per_run(samples):
+        # least squares slope of utilization over run number
+        n = len(samples)
+        mean_run = sum(run for run, _ in samples) / n
+        mean_utilization = sum(utilization for _, utilization in samples) / n
+        variance = sum((run - mean_run) ** 2 for run, _ in samples)
+        if variance == 0:
+            return 0
+        return sum((run - mean_run) * (utilization - mean_utilization) for run, utilization in samples) / variance
+
+    def record(self, quota, usage, limit):
+        # failed checks leave the history alone so the quota is due again next run
+        if usage is None or not limit or limit <= 0:
+            return
+
+        entry = self._history['quotas'].setdefault(self._key(quota), {'last_run': 0, 'samples': []})
+        entry['last_run'] = self.run
+        entry['samples'] = (entry['samples'] + [[self.run, usage / limit]])[-MAX_SAMPLES:]
+
+    def save(self):
+        self._history['run'] = self.run
+        self._history['updated'] = time.time()
+
+        with _memory_lock:
+            _memory[self.cache_key] = self._history
+
+        if self.store:
+            try:
+                self.store.put(self.cache_key, self._history)
+            except Exception as e:
+                logger.error(f"Error saving usage history for {self.region}: {str(e)}")
@@ -0,0 +1,54 @@
+import clients
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Splits a run into shards of region x service code group. Services with registered checkers do the
+# expensive work so each gets a shard of its own, the remaining (CloudWatch only) services are
+# bundled group_size at a time.
+def build_shards(region_services, checker_services, group_size=25, account_ids=(None,)):
+    shards = []
+    for region, service_codes in region_services.items():
+        heavy = [code for code in service_codes if code in checker_services]
+        light = [code for code in service_codes if code not in checker_services]
+        groups = [[code] for code in heavy] + [light[i:i + group_size] for i in range(0, len(light), group_size)]
+
+        for account_id in account_ids:
+            for group in groups:
+                shards.append({
+                    'shard_id': f"{len(shards):04d}",
+                    'account_id': account_id,
+                    'region': region,
+                    'service_codes': group
+                })
+    return shards
+
+# Invokes each worker asynchronously through the Lambda API
+class LambdaOrchestrator:
+    def __init__(self, function_name):
+        self.function_name = function_name
+        self.client = clients.get_client('lambda', None)
+
+    def invoke(self, payload):
+        self.client.invoke(FunctionName=self.function_name, InvocationType='Event', Payload=json.dumps(payload))
+
+# Runs each worker in the current process, for local testing
+class InProcessOrchestrator:
+    def __init__(self, handler):
+        self.handler = handler
+
+    def invoke(self, payload):
+        self.handler(json.loads(json.dumps(payload)), None)
+
+def merge_results(shard_documents):
+    results = {}
+    for document in shard_documents:
+        shard = document['shard']
+        if not document['results']:
+            continue
+
+        # the report is keyed by account only when checking an organization
+        target = results.setdefault(shard['account_id'], {}) if shard.get('account_id') else results
+        target.setdefault(shard['region'], []).extend(document['results'])
+    return results
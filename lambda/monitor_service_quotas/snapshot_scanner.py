@@ -0,0 +1,35 @@
+import asyncio
+import clients
+import reducers
+import run_cache
+
+# Scans the snapshots of a region once per run and computes every snapshot aggregate the checkers
+# need in that one pass. Accounts backed up by AWS Backup have hundreds of thousands of snapshots,
+# so each source is read exactly once at its largest page size. Pages are folded into the
+# aggregates as they stream in and never kept, memory only grows with the number of volumes that
+# have archived snapshots.
+
+def _ebs_aggregates():
+    return reducers.Combine(
+        snapshots=reducers.Count(),
+        max_archived_per_volume=reducers.MaxCountBy('VolumeId', where=lambda snapshot: snapshot.get('StorageTier') == 'archive')
+    )
+
+async def scan_ebs_async(engine, region):
+    ec2 = engine.client(clients.get_client('ec2', region))
+    return await ec2.reduce('describe_snapshots', 'Snapshots', _ebs_aggregates(), OwnerIds=['self'])
+
+async def scan_rds_async(engine, region):
+    rds = engine.client(clients.get_client('rds', region))
+    # instance and cluster snapshots are separate sources, both are read at the same time
+    instance_snapshots, cluster_snapshots = await asyncio.gather(
+        rds.reduce('describe_db_snapshots', 'DBSnapshots', reducers.Count(), SnapshotType='manual'),
+        rds.reduce('describe_db_cluster_snapshots', 'DBClusterSnapshots', reducers.Count(), SnapshotType='manual')
+    )
+    return {'manual_instance_snapshots': instance_snapshots, 'manual_cluster_snapshots': cluster_snapshots}
+
+async def ebs_async(engine, region):
+    return await run_cache.get_async('ebs-snapshots', region, lambda: scan_ebs_async(engine, region))
+
+async def rds_async(engine, region):
+    return await run_cache.get_async('rds-snapshots', region, lambda: scan_rds_async(engine, region))
@@ -0,0 +1,204 @@
+import json
+import logging
+import os
+import uuid
+import zlib
+import clients
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Persistent JSON documents shared between invocations (quota catalog, usage history, shard results, ...).
+# The backend is picked from SERVICE_QUOTA_STATE_URI:
+#   s3://bucket/prefix
+#   dynamodb://table
+#   file:///path/to/dir   (local testing)
+
+class S3StateStore:
+    def __init__(self, bucket, prefix):
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self.client = clients.get_client('s3', None)
+
+    def _object_key(self, key):
+        return f"{self.prefix}/{key}.json" if self.prefix else f"{key}.json"
+
+    def get(self, key):
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self._object_key(key))
+        except self.client.exceptions.NoSuchKey:
+            return None
+        return json.loads(response['Body'].read())
+
+    def put(self, key, value):
+        self.client.put_object(Bucket=self.bucket, Key=self._object_key(key), Body=json.dumps(value, default=str))
+
+    def put_if_absent(self, key, value):
+        try:
+            self.client.put_object(Bucket=self.bucket, Key=self._object_key(key), Body=json.dumps(value, default=str), IfNoneMatch='*')
+        except self.client.exceptions.ClientError as e:
+            if e.response['Error']['Code'] in ('PreconditionFailed', 'ConditionalRequestConflict'):
+                return False
+            raise
+        return True
+
+    def list_keys(self, prefix):
+        object_prefix = self._object_key(prefix)[:-len('.json')]
+        keys = []
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=object_prefix):
+            for item in page.get('Contents', []):
+                keys.append(prefix + item['Key'][len(object_prefix):-len('.json')])
+        return keys
+
+# DynamoDB items are limited to 400 KB, documents are stored zlib compressed and split over chunk items
+# when still too large. The item under the document key holds the version of its chunks, which are
+# written first so the document only ever points at complete chunks.
+DYNAMODB_CHUNK_BYTES = 350 * 1024
+
+class DynamoDBStateStore:
+    def __init__(self, table):
+        self.table = table
+        self.client = clients.get_client('dynamodb', None)
+
+    def _chunk_keys(self, key, version, chunks):
+        return [f"{key}#{version}/{i}" for i in range(chunks)]
+
+    def _get_item(self, key):
+        return self.client.get_item(TableName=self.table, Key={'Key': {'S': key}}, ConsistentRead=True).get('Item')
+
+    def get(self, key):
+        item = self._get_item(key)
+        if item is None:
+            return None
+        if 'Value' in item:
+            return json.loads(item['Value']['S'])
+        if 'Data' in item:
+            return json.loads(zlib.decompress(item['Data']['B']))
+
+        data = b''
+        for chunk_key in self._chunk_keys(key, item['Version']['S'], int(item['Chunks']['N'])):
+            chunk = self._get_item(chunk_key)
+            if chunk is None:
+                raise RuntimeError(f"Chunk {chunk_key} of {key} is missing from {self.table}")
+            data += chunk['Data']['B']
+        return json.loads(zlib.decompress(data))
+
+    def _put_item(self, key, value):
+        data = zlib.compress(json.dumps(value, default=str).encode())
+        if len(data) <= DYNAMODB_CHUNK_BYTES:
+            return {'Key': {'S': key}, 'Data': {'B': data}}, []
+
+        version = uuid.uuid4().hex
+        chunks = [data[i:i + DYNAMODB_CHUNK_BYTES] for i in range(0, len(data), DYNAMODB_CHUNK_BYTES)]
+        chunk_keys = self._chunk_keys(key, version, len(chunks))
+        for chunk_key, chunk in zip(chunk_keys, chunks):
+            self.client.put_item(TableName=self.table, Item={'Key': {'S': chunk_key}, 'Chunk': {'S': key}, 'Data': {'B': chunk}})
+        return {'Key': {'S': key}, 'Version': {'S': version}, 'Chunks': {'N': str(len(chunks))}}, chunk_keys
+
+    def _delete_chunks(self, chunk_keys):
+        for chunk_key in chunk_keys:
+            try:
+                self.client.delete_item(TableName=self.table, Key={'Key': {'S': chunk_key}})
+            except Exception as e:
+                logger.warning(f"Could not delete {chunk_key} from {self.table}: {e}")
+
+    def _replaced_chunks(self, key, attributes):
+        if 'Version' not in attributes:
+            return []
+        return self._chunk_keys(key, attributes['Version']['S'], int(attributes['Chunks']['N']))
+
+    def put(self, key, value):
+        item, _ = self._put_item(key, value)
+        response = self.client.put_item(TableName=self.table, Item=item, ReturnValues='ALL_OLD')
+        self._delete_chunks(self._replaced_chunks(key, response.get('Attributes', {})))
+
+    def put_if_absent(self, key, value):
+        item, chunk_keys = self._put_item(key, value)
+        try:
+            self.client.put_item(
+                TableName=self.table,
+                Item=item,
+                ConditionExpression='attribute_not_exists(#k)',
+                ExpressionAttributeNames={'#k': 'Key'}
+            )
+        except self.client.exceptions.ConditionalCheckFailedException:
+            self._delete_chunks(chunk_keys)
+            return False
+        return True
+
+    def list_keys(self, prefix):
+        keys = []
+        paginator = self.client.get_paginator('scan')
+        for page in paginator.paginate(
+            TableName=self.table,
+            ProjectionExpression='#k',
+            FilterExpression='begins_with(#k, :prefix) AND attribute_not_exists(#c)',
+            ExpressionAttributeNames={'#k': 'Key', '#c': 'Chunk'},
+            ExpressionAttributeValues={':prefix': {'S': prefix}}
+        ):
+            keys.extend(item['Key']['S'] for item in page['Items'])
+        return keys
+
+class FileStateStore:
+    def __init__(self, path):
+        self.path = path
+
+    def _file_name(self, key):
+        return os.path.join(self.path, f"{key}.json")
+
+    def get(self, key):
+        try:
+            with open(self._file_name(key)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, value):
+        file_name = self._file_name(key)
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+        with open(file_name, 'w') as f:
+            json.dump(value, f, default=str)
+
+    def put_if_absent(self, key, value):
+        file_name = self._file_name(key)
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+        try:
+            with open(file_name, 'x') as f:
+                json.dump(value, f, default=str)
+        except FileExistsError:
+            return False
+        return True
+
+    def list_keys(self, prefix):
+        directory, _, name_prefix = os.path.join(self.path, prefix).rpartition(os.sep)
+        if not os.path.isdir(directory):
+            return []
+        key_directory = os.path.relpath(directory, self.path)
+        return [
+            os.path.join(key_directory, file_name[:-len('.json')]).replace(os.sep, '/')
+            for file_name in sorted(os.listdir(directory))
+            if file_name.startswith(name_prefix) and file_name.endswith('.json')
+        ]
+
+def from_uri(uri):
+    if not uri:
+        return None
+
+    parsed = urlparse(uri)
+    if parsed.scheme == 's3':
+        return S3StateStore(parsed.netloc, parsed.path)
+    elif parsed.scheme == 'dynamodb':
+        return DynamoDBStateStore(parsed.netloc)
+    elif parsed.scheme == 'file':
+        return FileStateStore(parsed.netloc + parsed.path)
+    else:
+        raise ValueError(f"Unsupported state store: {uri}")
+
+_store = None
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = from_uri(os.environ.get('SERVICE_QUOTA_STATE_URI')) or False
+    return _store or None
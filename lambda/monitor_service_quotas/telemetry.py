@@ -0,0 +1,191 @@
+import json
+import logging
+import os
+import threading
+import time
+from botocore import xform_name
+from rate_limiter import THROTTLE_ERROR_CODES
+
+logger = logging.getLogger(__name__)
+
+# When disabled clients are returned untouched, no handlers are registered
+ENABLED = os.environ.get('SERVICE_QUOTA_TELEMETRY', '').lower() == 'true'
+NAMESPACE = os.environ.get('SERVICE_QUOTA_TELEMETRY_NAMESPACE', 'MonitorServiceQuotas/API')
+
+# Upper bounds (in ms) of the latency histogram buckets, the last bucket is unbounded
+LATENCY_BUCKETS_MS = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+def _new_stats():
+    return {
+        'calls': 0,
+        'cache_hits': 0,
+        'errors': 0,
+        'retries': 0,
+        'throttles': 0,
+        'pages': 0,
+        'latency_ms': 0.0,
+        'max_latency_ms': 0.0,
+        'histogram': [0] * (len(LATENCY_BUCKETS_MS) + 1)
+    }
+
+# Aggregates calls per (service, operation, region) from the botocore event system
+class Telemetry:
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def _record(self, key, **updates):
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = _new_stats()
+            for name, value in updates.items():
+                stats[name] += value
+            return stats
+
+    def _record_latency(self, key, latency_ms):
+        bucket = next((i for i, bound in enumerate(LATENCY_BUCKETS_MS) if latency_ms <= bound), len(LATENCY_BUCKETS_MS))
+        with self._lock:
+            stats = self._stats[key]
+            stats['latency_ms'] += latency_ms
+            stats['max_latency_ms'] = max(stats['max_latency_ms'], latency_ms)
+            stats['histogram'][bucket] += 1
+
+    def attach(self, client):
+        region = client.meta.region_name or 'global'
+        service_name = client.meta.service_model.service_name
+        paginated = {}
+
+        def is_paginated(operation_name):
+            if operation_name not in paginated:
+                paginated[operation_name] = client.can_paginate(xform_name(operation_name))
+            return paginated[operation_name]
+
+        # registered after the API cache, so this only runs for calls that go out to AWS
+        def before_call(context, **kwargs):
+            context['telemetry_start'] = time.perf_counter()
+
+        def after_call(http_response, parsed, model, context, **kwargs):
+            key = (service_name, model.name, region)
+            start = context.pop('telemetry_start', None)
+            if start is None:
+                self._record(key, calls=1, cache_hits=1)
+                return
+
+            self._record(
+                key,
+                calls=1,
+                errors=1 if http_response.status_code >= 300 else 0,
+                retries=parsed.get('ResponseMetadata', {}).get('RetryAttempts', 0),
+                pages=1 if is_paginated(model.name) else 0
+            )
+            self._record_latency(key, (time.perf_counter() - start) * 1000)
+
+        def after_call_error(event_name, context, **kwargs):
+            start = context.pop('telemetry_start', None)
+            if start is not None:
+                key = (service_name, event_name.rsplit('.', 1)[-1], region)
+                self._record(key, calls=1, errors=1)
+                self._record_latency(key, (time.perf_counter() - start) * 1000)
+
+        def needs_retry(response=None, operation=None, **kwargs):
+            if response is None or operation is None:
+                return None
+            if response[1].get('Error', {}).get('Code') in THROTTLE_ERROR_CODES:
+                self._record((service_name, operation.name, region), throttles=1)
+            return None
+
+        client.meta.events.register('before-call', before_call)
+        client.meta.events.register('after-call', after_call)
+        client.meta.events.register('after-call-error', after_call_error)
+        client.meta.events.register('needs-retry', needs_retry)
+        return client
+
+    def summary(self):
+        with self._lock:
+            items = [(key, dict(stats, histogram=list(stats['histogram']))) for key, stats in self._stats.items()]
+
+        summary = []
+        for (service_name, operation_name, region), stats in items:
+            requests = stats['calls'] - stats['cache_hits']
+            summary.append({
+                'service': service_name,
+                'operation': operation_name,
+                'region': region,
+                **stats,
+                'latency_ms': round(stats['latency_ms'], 1),
+                'max_latency_ms': round(stats['max_latency_ms'], 1),
+                'avg_latency_ms': round(stats['latency_ms'] / requests, 1) if requests else 0,
+                'p90_latency_ms': _percentile(stats['histogram'], 0.9)
+            })
+        # the operations that take the most time first
+        return sorted(summary, key=lambda item: item['latency_ms'], reverse=True)
+
+    def emit(self):
+        summary = self.summary()
+        timestamp = int(time.time() * 1000)
+        # one EMF record per (service, operation, region) written together at the end of the run
+        for item in summary:
+            print(json.dumps({
+                '_aws': {
+                    'Timestamp': timestamp,
+                    'CloudWatchMetrics': [{
+                        'Namespace': NAMESPACE,
+                        'Dimensions': [['Service', 'Operation', 'Region']],
+                        'Metrics': [
+                            {'Name': 'Calls', 'Unit': 'Count'},
+                            {'Name': 'CacheHits', 'Unit': 'Count'},
+                            {'Name': 'Errors', 'Unit': 'Count'},
+                            {'Name': 'Retries', 'Unit': 'Count'},
+                            {'Name': 'Throttles', 'Unit': 'Count'},
+                            {'Name': 'Pages', 'Unit': 'Count'},
+                            {'Name': 'Latency', 'Unit': 'Milliseconds'},
+                            {'Name': 'MaxLatency', 'Unit': 'Milliseconds'}
+                        ]
+                    }]
+                },
+                'Service': item['service'],
+                'Operation': item['operation'],
+                'Region': item['region'],
+                'Calls': item['calls'],
+                'CacheHits': item['cache_hits'],
+                'Errors': item['errors'],
+                'Retries': item['retries'],
+                'Throttles': item['throttles'],
+                'Pages': item['pages'],
+                'Latency': item['latency_ms'],
+                'MaxLatency': item['max_latency_ms'],
+                'LatencyHistogram': dict(zip([f"le_{bound}" for bound in LATENCY_BUCKETS_MS] + ['le_inf'], item['histogram']))
+            }))
+        return summary
+
+def _percentile(histogram, fraction):
+    total = sum(histogram)
+    if not total:
+        return 0
+    seen = 0
+    for bound, count in zip(LATENCY_BUCKETS_MS + [None], histogram):
+        seen += count
+        if seen >= total * fraction:
+            return bound if bound is not None else LATENCY_BUCKETS_MS[-1]
+    return LATENCY_BUCKETS_MS[-1]
+
+_telemetry = Telemetry()
+
+def attach(client):
+    if not ENABLED:
+        return client
+    return _telemetry.attach(client)
+
+def reset():
+    _telemetry.reset()
+
+def summary():
+    return _telemetry.summary()
+
+def emit():
+    return _telemetry.emit()
@@ -0,0 +1,105 @@
+import asyncio
+import clients
+import logging
+import reducers
+import run_cache
+
+logger = logging.getLogger(__name__)
+
+# search_transit_gateway_routes returns at most this many routes and has no next token
+MAX_ROUTE_RESULTS = 1000
+ROUTE_TYPES = ['static', 'propagated']
+
+# Snapshot of the transit gateway topology of a region, taken once per run for every transit
+# gateway quota. Transit gateways, attachments, multicast domains and route tables are each listed
+# once for the whole region, then the routes of every route table and the associations and group
+# members of every multicast domain are fetched concurrently.
+class TransitGatewayTopology:
+    def __init__(self, transit_gateways, attachments, multicast_vpc_domains, multicast_interfaces, routes):
+        self.transit_gateways = transit_gateways
+        # transit gateway id: attachments
+        self.attachments = attachments
+        # VPC id: multicast domains it is associated with
+        self.multicast_vpc_domains = multicast_vpc_domains
+        # transit gateway id: network interfaces that are members or sources of its multicast groups
+        self.multicast_interfaces = multicast_interfaces
+        # transit gateway id: routes over all its route tables
+        self.routes = routes
+
+    def max_attachments(self):
+        return max(self.attachments.values(), default=0)
+
+    def max_multicast_domains_per_vpc(self):
+        return max(self.multicast_vpc_domains.values(), default=0)
+
+    def max_multicast_interfaces(self):
+        return max(self.multicast_interfaces.values(), default=0)
+
+    def max_routes(self):
+        return max(self.routes.values(), default=0)
+
+async def _search_routes(ec2, route_table_id, route_types):
+    response = await ec2.search_transit_gateway_routes(
+        TransitGatewayRouteTableId=route_table_id,
+        Filters=[{'Name': 'type', 'Values': route_types}],
+        MaxResults=MAX_ROUTE_RESULTS
+    )
+    return len(response['Routes']), response.get('AdditionalRoutesAvailable', False)
+
+async def count_routes(ec2, route_table_id):
+    count, truncated = await _search_routes(ec2, route_table_id, ROUTE_TYPES)
+    if not truncated:
+        return count
+
+    # the results are capped, each route type is searched on its own to get further
+    counts = await asyncio.gather(*(_search_routes(ec2, route_table_id, [route_type]) for route_type in ROUTE_TYPES))
+    if any(truncated for _, truncated in counts):
+        logger.warning(f"More than {MAX_ROUTE_RESULTS} routes of one type in {route_table_id}, the route count is a lower bound")
+    return sum(count for count, _ in counts)
+
+async def _multicast_domain(ec2, domain_id):
+    associations, groups = await asyncio.gather(
+        ec2.paginate('get_transit_gateway_multicast_domain_associations', 'MulticastDomainAssociations', TransitGatewayMulticastDomainId=domain_id),
+        ec2.paginate('search_transit_gateway_multicast_groups', 'MulticastGroups', TransitGatewayMulticastDomainId=domain_id)
+    )
+    vpcs = {association['ResourceId'] for association in associations if association.get('ResourceType') == 'vpc'}
+    interfaces = {group['NetworkInterfaceId'] for group in groups if group.get('NetworkInterfaceId')}
+    return vpcs, interfaces
+
+async def build_async(engine, region):
+    ec2 = engine.client(clients.get_client('ec2', region))
+
+    attachments = reducers.MaxCountBy('TransitGatewayId')
+    transit_gateways, _, multicast_domains, route_tables = await asyncio.gather(
+        ec2.reduce('describe_transit_gateways', 'TransitGateways', reducers.Count()),
+        ec2.reduce('describe_transit_gateway_attachments', 'TransitGatewayAttachments', attachments),
+        ec2.paginate('describe_transit_gateway_multicast_domains', 'TransitGatewayMulticastDomains'),
+        ec2.paginate('describe_transit_gateway_route_tables', 'TransitGatewayRouteTables')
+    )
+
+    route_counts, multicast = await asyncio.gather(
+        asyncio.gather(*(count_routes(ec2, route_table['TransitGatewayRouteTableId']) for route_table in route_tables)),
+        asyncio.gather(*(_multicast_domain(ec2, domain['TransitGatewayMulticastDomainId']) for domain in multicast_domains))
+    )
+
+    routes = {}
+    for route_table, count in zip(route_tables, route_counts):
+        routes[route_table['TransitGatewayId']] = routes.get(route_table['TransitGatewayId'], 0) + count
+
+    multicast_vpc_domains = {}
+    multicast_interfaces = {}
+    for domain, (vpcs, interfaces) in zip(multicast_domains, multicast):
+        for vpc_id in vpcs:
+            multicast_vpc_domains[vpc_id] = multicast_vpc_domains.get(vpc_id, 0) + 1
+        multicast_interfaces.setdefault(domain['TransitGatewayId'], set()).update(interfaces)
+
+    return TransitGatewayTopology(
+        transit_gateways,
+        attachments.counts,
+        multicast_vpc_domains,
+        {tgw_id: len(interfaces) for tgw_id, interfaces in multicast_interfaces.items()},
+        routes
+    )
+
+async def get_async(engine, region):
+    return await run_cache.get_async('tgw-topology', region, lambda: build_async(engine, region))
@@ -0,0 +1,78 @@
+import logging
+from datetime import datetime, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+# GetMetricData accepts at most 500 queries per request
+MAX_QUERIES_PER_REQUEST = 500
+
+# Collects the UsageMetric of every quota in a region so they can be read with a handful of
+# GetMetricData calls instead of one GetMetricStatistics call per quota
+class UsageMetricResolver:
+
+    def __init__(self, lookback_minutes=10, period=300):
+        self.lookback_minutes = lookback_minutes
+        self.period = period
+        self._queries = {}
+        self._values = {}
+
+    def add(self, usage_metric):
+        key = self._metric_key(usage_metric)
+        if key not in self._queries:
+            self._queries[key] = {
+                'Id': f"m{len(self._queries)}",
+                'MetricStat': {
+                    'Metric': {
+                        'Namespace': usage_metric['MetricNamespace'],
+                        'MetricName': usage_metric['MetricName'],
+                        'Dimensions': [{'Name': name, 'Value': value} for name, value in key[2]]
+                    },
+                    'Period': self.period,
+                    'Stat': key[3]
+                },
+                'ReturnData': True
+            }
+        return key
+
+    def resolve(self, cloudwatch_client):
+        queries = list(self._queries.values())
+        key_by_id = {query['Id']: key for key, query in self._queries.items()}
+        end_time = datetime.now(timezone.utc)
+        start_time = end_time - timedelta(minutes=self.lookback_minutes)
+
+        paginator = cloudwatch_client.get_paginator('get_metric_data')
+        for i in range(0, len(queries), MAX_QUERIES_PER_REQUEST):
+            batch = queries[i:i + MAX_QUERIES_PER_REQUEST]
+            try:
+                for page in paginator.paginate(MetricDataQueries=batch, StartTime=start_time, EndTime=end_time, ScanBy='TimestampDescending'):
+                    for result in page['MetricDataResults']:
+                        key = key_by_id[result['Id']]
+                        # results are newest first, keep the latest datapoint across pages
+                        if key not in self._values and result['Values']:
+                            self._values[key] = result['Values'][0]
+            except Exception as e:
+                logger.error(f"Error getting metric data: {str(e)}")
+
+        logger.debug(f"Resolved {len(self._values)} of {len(queries)} usage metrics")
+        return self._values
+
+    def get_value(self, key):
+        # this will typically be no data
+        return self._values.get(key)
+
+    def __len__(self):
+        return len(self._queries)
+
+    @staticmethod
+    def _metric_key(usage_metric):
+        dimensions = usage_metric.get('MetricDimensions') or {}
+        # the service quotas API returns dimensions as a map, tolerate the list form as well
+        if isinstance(dimensions, list):
+            dimensions = {dim['Name']: dim['Value'] for dim in dimensions if isinstance(dim, dict) and 'Name' in dim and 'Value' in dim}
+
+        return (
+            usage_metric['MetricNamespace'],
+            usage_metric['MetricName'],
+            tuple(sorted(dimensions.items())),
+            usage_metric.get('MetricStatisticRecommendation') or 'Maximum'
+        )
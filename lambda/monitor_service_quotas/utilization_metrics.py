@@ -0,0 +1,106 @@
+import json
+import os
+import threading
+import time
+
+# When enabled every computed usage is logged as CloudWatch embedded metrics, not only the ones
+# above the threshold
+ENABLED = os.environ.get('SERVICE_QUOTA_UTILIZATION_METRICS', '').lower() == 'true'
+NAMESPACE = os.environ.get('SERVICE_QUOTA_UTILIZATION_NAMESPACE', 'MonitorServiceQuotas/Utilization')
+
+# CloudWatch accepts at most 100 metrics per EMF record
+MAX_METRICS_PER_RECORD = 100
+METRICS_PER_QUOTA = 3
+
+# Collects (account, region, service, quota, usage, limit) from the checks and writes them as EMF log
+# records. Dimension values belong to the whole record, so the quota is part of the metric name
+# ("L-1216C47A Usage") and a record holds the quotas of one account, region and service.
+class UtilizationMetrics:
+    def __init__(self):
+        self._items = []
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self._items.clear()
+
+    def record(self, account_id, region, service, quota, usage, limit):
+        with self._lock:
+            self._items.append({
+                'account_id': account_id,
+                'region': region,
+                'service_code': quota['ServiceCode'],
+                'service_name': service['ServiceName'],
+                'quota_code': quota['QuotaCode'],
+                'quota_name': quota['QuotaName'],
+                'usage': usage,
+                'limit': limit
+            })
+
+    def records(self, timestamp=None):
+        with self._lock:
+            items = list(self._items)
+
+        timestamp = timestamp or int(time.time() * 1000)
+        groups = {}
+        for item in items:
+            # the last usage of a quota wins
+            groups.setdefault((item['account_id'], item['region'], item['service_code']), {})[item['quota_code']] = item
+
+        per_record = MAX_METRICS_PER_RECORD // METRICS_PER_QUOTA
+        for (account_id, region, service_code), quotas in groups.items():
+            quotas = sorted(quotas.values(), key=lambda item: item['quota_code'])
+            for start in range(0, len(quotas), per_record):
+                yield self._record(timestamp, account_id, region, service_code, quotas[start:start + per_record])
+
+    def _record(self, timestamp, account_id, region, service_code, quotas):
+        dimensions = ['Region', 'Service']
+        record = {'Region': region, 'Service': service_code, 'ServiceName': quotas[0]['service_name']}
+        if account_id:
+            dimensions.insert(0, 'Account')
+            record['Account'] = account_id
+
+        metrics = []
+        for item in quotas:
+            code = item['quota_code']
+            metrics.extend([
+                {'Name': f"{code} Usage", 'Unit': 'Count'},
+                {'Name': f"{code} Limit", 'Unit': 'Count'},
+                {'Name': f"{code} Percentage", 'Unit': 'Percent'}
+            ])
+            record[f"{code} Usage"] = item['usage']
+            record[f"{code} Limit"] = item['limit']
+            record[f"{code} Percentage"] = round(item['usage'] / item['limit'] * 100, 2) if item['limit'] > 0 else 0
+
+        return {
+            '_aws': {
+                'Timestamp': timestamp,
+                'CloudWatchMetrics': [{
+                    'Namespace': NAMESPACE,
+                    'Dimensions': [dimensions],
+                    'Metrics': metrics
+                }]
+            },
+            **record,
+            # the metric names only carry the quota code, the names make the log searchable
+            'QuotaNames': {item['quota_code']: item['quota_name'] for item in quotas}
+        }
+
+    def emit(self):
+        count = 0
+        for record in self.records():
+            print(json.dumps(record))
+            count += 1
+        return count
+
+_metrics = UtilizationMetrics()
+
+def record(account_id, region, service, quota, usage, limit):
+    if ENABLED and usage is not None:
+        _metrics.record(account_id, region, service, quota, usage, limit)
+
+def reset():
+    _metrics.reset()
+
+def emit():
+    return _metrics.emit()
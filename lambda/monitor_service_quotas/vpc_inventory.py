@@ -0,0 +1,107 @@
+import asyncio
+import clients
+import run_cache
+
+# Regional inventory of the VPC resources every vpc quota is answered from.
+#
+# Each listing below is read once per run in a single paginated pass, the passes run concurrently.
+# Items are folded into counters as they arrive (totals, counts per VPC and per Availability Zone,
+# and the largest per-item sizes such as rules per security group), so the inventory only grows
+# with the number of VPCs and subnets, not with the number of resources.
+
+def _security_group_rules(group):
+    # IPv4 and IPv6 rules count against the quota separately, referenced groups and prefix lists
+    # count against both
+    def direction(permissions):
+        shared = sum(len(p.get('UserIdGroupPairs', [])) + len(p.get('PrefixListIds', [])) for p in permissions)
+        ipv4 = sum(len(p.get('IpRanges', [])) for p in permissions)
+        ipv6 = sum(len(p.get('Ipv6Ranges', [])) for p in permissions)
+        return shared + max(ipv4, ipv6)
+    return max(direction(group.get('IpPermissions', [])), direction(group.get('IpPermissionsEgress', [])))
+
+DEFAULT_NETWORK_ACL_RULES = {32767, 32768}
+
+def _network_acl_rules(network_acl):
+    # the default rules (numbered 32767 for IPv4 and 32768 for IPv6) can't be removed and don't count
+    entries = [entry for entry in network_acl.get('Entries', []) if entry.get('RuleNumber') not in DEFAULT_NETWORK_ACL_RULES]
+    inbound = sum(1 for entry in entries if not entry.get('Egress'))
+    return max(inbound, len(entries) - inbound)
+
+def _non_propagated_routes(route_table):
+    return sum(1 for route in route_table.get('Routes', []) if route.get('Origin') != 'EnableVgwRoutePropagation')
+
+def _ipv4_cidr_blocks(vpc):
+    associations = vpc.get('CidrBlockAssociationSet') or [{'CidrBlockState': {'State': 'associated'}}]
+    return sum(1 for association in associations if association.get('CidrBlockState', {}).get('State') == 'associated')
+
+# resource: (operation, result key, request parameters, per-item sizes)
+LISTINGS = {
+    'vpcs': ('describe_vpcs', 'Vpcs', {}, {'ipv4_cidr_blocks': _ipv4_cidr_blocks}),
+    'subnets': ('describe_subnets', 'Subnets', {}, {}),
+    'route_tables': ('describe_route_tables', 'RouteTables', {}, {'routes': _non_propagated_routes}),
+    'network_interfaces': ('describe_network_interfaces', 'NetworkInterfaces', {}, {'security_groups': lambda eni: len(eni.get('Groups', []))}),
+    'security_groups': ('describe_security_groups', 'SecurityGroups', {}, {'rules': _security_group_rules}),
+    'network_acls': ('describe_network_acls', 'NetworkAcls', {}, {'rules': _network_acl_rules}),
+    'nat_gateways': ('describe_nat_gateways', 'NatGateways', {'Filters': [{'Name': 'state', 'Values': ['pending', 'available']}]}, {}),
+    'internet_gateways': ('describe_internet_gateways', 'InternetGateways', {}, {}),
+}
+
+class ResourceIndex:
+    def __init__(self, sizes=None, track_zones=False):
+        self.sizes = sizes or {}
+        self.track_zones = track_zones
+        self.count = 0
+        self.by_vpc = {}
+        self.by_az = {}
+        self.by_subnet = {}
+        self.max_size = {name: 0 for name in self.sizes}
+        self.zones = {}
+
+    def add(self, item):
+        self.count += 1
+        for counts, key in ((self.by_vpc, item.get('VpcId')), (self.by_az, item.get('AvailabilityZone')), (self.by_subnet, item.get('SubnetId'))):
+            if key is not None:
+                counts[key] = counts.get(key, 0) + 1
+        for name, size in self.sizes.items():
+            self.max_size[name] = max(self.max_size[name], size(item))
+        # subnet -> Availability Zone, for resources that only know their subnet
+        if self.track_zones:
+            self.zones[item['SubnetId']] = item['AvailabilityZone']
+
+    def result(self):
+        return self
+
+class VpcInventory:
+    def __init__(self, indexes):
+        self.indexes = indexes
+        # NAT gateways only carry their subnet
+        zones = indexes['subnets'].zones
+        nat_gateways = indexes['nat_gateways']
+        for subnet_id, count in nat_gateways.by_subnet.items():
+            zone = zones.get(subnet_id)
+            if zone is not None:
+                nat_gateways.by_az[zone] = nat_gateways.by_az.get(zone, 0) + count
+
+    def count(self, resource):
+        return self.indexes[resource].count
+
+    def max_per_vpc(self, resource):
+        return max(self.indexes[resource].by_vpc.values(), default=0)
+
+    def max_per_az(self, resource):
+        return max(self.indexes[resource].by_az.values(), default=0)
+
+    def max_size(self, resource, size):
+        return self.indexes[resource].max_size[size]
+
+async def build_async(engine, region):
+    ec2 = engine.client(clients.get_client('ec2', region))
+    resources = list(LISTINGS)
+    indexes = await asyncio.gather(*(
+        ec2.reduce(operation_name, result_key, ResourceIndex(sizes, track_zones=resource == 'subnets'), **params)
+        for resource, (operation_name, result_key, params, sizes) in LISTINGS.items()
+    ))
+    return VpcInventory(dict(zip(resources, indexes)))
+
+async def get_async(engine, region):
+    return await run_cache.get_async('vpc-inventory', region, lambda: build_async(engine, region))
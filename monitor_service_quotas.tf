@@ -27,6 +27,7 @@ data "aws_iam_policy_document" "monitor_service_quotas_execution" {
   statement {
     effect = "Allow"
     actions = [
+      "cloudwatch:GetMetricData",
       "cloudwatch:GetMetricStatistics",
       "cloudwatch:ListMetrics"
     ]
@@ -44,6 +45,63 @@ data "aws_iam_policy_document" "monitor_service_quotas_execution" {
     ]
   }
 
+  dynamic "statement" {
+    for_each = var.service_quota_member_role_name != null ? [1] : []
+
+    content {
+      effect    = "Allow"
+      resources = ["*"] #tfsec:ignore:avd-aws-0057
+
+      actions = [
+        "organizations:ListAccounts"
+      ]
+    }
+  }
+
+  dynamic "statement" {
+    for_each = var.service_quota_member_role_name != null ? [1] : []
+
+    content {
+      effect    = "Allow"
+      resources = ["arn:${local.partition}:iam::*:role/${var.service_quota_member_role_name}"]
+
+      actions = [
+        "sts:AssumeRole"
+      ]
+    }
+  }
+
+  dynamic "statement" {
+    for_each = var.service_quota_sharding || var.service_quota_state_bucket != null ? [1] : []
+
+    content {
+      effect    = "Allow"
+      resources = ["arn:${local.partition}:lambda:${local.region}:${local.account_id}:function:${var.name_prefix}monitor_service_quotas_execution"]
+
+      actions = [
+        "lambda:InvokeFunction"
+      ]
+    }
+  }
+
+  dynamic "statement" {
+    for_each = var.service_quota_state_bucket != null ? [1] : []
+
+    content {
+      effect    = "Allow"
+      resources = [
+        "arn:${local.partition}:s3:::${var.service_quota_state_bucket}",
+        "arn:${local.partition}:s3:::${var.service_quota_state_bucket}/monitor_service_quotas/*"
+      ]
+
+      actions = [
+        "s3:GetObject",
+        "s3:ListBucket",
+        "s3:PutObject"
+      ]
+    }
+  }
+
   statement {
     effect    = "Allow"
     resources = [aws_sns_topic.account_alerts.arn]
@@ -95,12 +153,43 @@ resource "aws_lambda_function" "monitor_service_quotas" {
   source_code_hash = data.archive_file.monitor_service_quotas.output_base64sha256
   tags             = local.tags
   timeout          = 900
+  memory_size      = var.service_quota_memory_size
 
   environment {
     variables = {
-      SNS_TOPIC_ARN             = aws_sns_topic.account_alerts.arn
-      SERVICE_QUOTA_THRESHOLD   = var.service_quota_threshold
-      SERVICE_QUOTA_REGION_LIST = join(",", var.service_quota_region_list)
+      SNS_TOPIC_ARN                           = aws_sns_topic.account_alerts.arn
+      SERVICE_QUOTA_THRESHOLD                 = var.service_quota_threshold
+      SERVICE_QUOTA_REGION_LIST               = join(",", var.service_quota_region_list)
+      SERVICE_QUOTA_REGION_CONCURRENCY        = var.service_quota_region_concurrency
+      SERVICE_QUOTA_METRIC_LOOKBACK_MINUTES   = var.service_quota_metric_lookback_minutes
+      SERVICE_QUOTA_CATALOG_TTL_HOURS         = var.service_quota_catalog_ttl_hours
+      SERVICE_QUOTA_API_RATES                 = join(",", [for service, rate in var.service_quota_api_rates : "${service}=${rate}"])
+      SERVICE_QUOTA_SCHEDULE_MAX_INTERVAL     = var.service_quota_schedule_max_interval
+      SERVICE_QUOTA_SCHEDULE_FULL_SWEEP_RUNS  = var.service_quota_schedule_full_sweep_runs
+      SERVICE_QUOTA_MEMBER_ROLE_NAME          = var.service_quota_member_role_name != null ? var.service_quota_member_role_name : ""
+      SERVICE_QUOTA_ACCOUNT_CONCURRENCY       = var.service_quota_account_concurrency
+      SERVICE_QUOTA_SHARDING                  = var.service_quota_sharding
+      SERVICE_QUOTA_SHARD_SERVICE_GROUP_SIZE  = var.service_quota_shard_service_group_size
+      SERVICE_QUOTA_CHECKPOINT_MARGIN_SECONDS = var.service_quota_checkpoint_margin_seconds
+      SERVICE_QUOTA_MAX_RESUMES               = var.service_quota_max_resumes
+      SERVICE_QUOTA_ENGINE                    = var.service_quota_engine
+      SERVICE_QUOTA_ASYNC_CONCURRENCY         = join(",", [for service, limit in var.service_quota_async_concurrency : "${service}=${limit}"])
+      SERVICE_QUOTA_TELEMETRY                 = var.service_quota_telemetry
+      SERVICE_QUOTA_UTILIZATION_METRICS       = var.service_quota_utilization_metrics
+      SERVICE_QUOTA_AMI_PERMISSION_TTL_HOURS  = var.service_quota_ami_permission_ttl_hours
+      SERVICE_QUOTA_STATE_URI                 = var.service_quota_state_bucket != null ? "s3://${var.service_quota_state_bucket}/monitor_service_quotas" : ""
+    }
+  }
+}
+
+# a shard that fails for good is recorded by the function itself, so its run still gets published
+resource "aws_lambda_function_event_invoke_config" "monitor_service_quotas" {
+  count         = var.service_quota_sharding ? 1 : 0
+  function_name = aws_lambda_function.monitor_service_quotas.function_name
+
+  destination_config {
+    on_failure {
+      destination = aws_lambda_function.monitor_service_quotas.arn
     }
   }
 }
@@ -58,12 +58,126 @@ variable "notify_ec2_missing_ami_if_snapshot_exists" {
   default     = true
 }
 
+variable "service_quota_account_concurrency" {
+  default     = 8
+  description = "Number of account and region pairs checked in parallel when service_quota_member_role_name is set"
+  type        = number
+}
+
+variable "service_quota_ami_permission_ttl_hours" {
+  default     = 72
+  description = "How long the launch permissions of an unchanged AMI are cached before they are looked up again, in hours. Cached across runs when service_quota_state_bucket is set. Keep it longer than the daily run interval"
+  type        = number
+}
+
+variable "service_quota_api_rates" {
+  default     = {}
+  description = "Overrides for the client side API rate limits used when checking service quotas, keyed by service as `requests_per_second:burst` (e.g. `{ ec2 = \"20:100\" }`)"
+  type        = map(string)
+}
+
+variable "service_quota_async_concurrency" {
+  default     = {}
+  description = "Overrides for the maximum number of in-flight API calls per service when service_quota_engine is `asyncio` (e.g. `{ ec2 = 50 }`)"
+  type        = map(number)
+}
+
+variable "service_quota_catalog_ttl_hours" {
+  default     = 168
+  description = "How long (in hours) the list of services and service quotas is cached before being listed again. Keep it longer than the daily run interval, quota values are confirmed again before alerting"
+  type        = number
+}
+
+variable "service_quota_checkpoint_margin_seconds" {
+  default     = 120
+  description = "When service_quota_state_bucket is set, a service quota run that has less than this many seconds left before the Lambda timeout saves its progress and continues in a new invocation"
+  type        = number
+}
+
+variable "service_quota_engine" {
+  default     = "threads"
+  description = "How the custom usage checks of a region are run: `threads` checks quotas one after another, `asyncio` overlaps the checks and their API calls on an event loop"
+  type        = string
+}
+
+variable "service_quota_max_resumes" {
+  default     = 10
+  description = "Maximum number of invocations a checkpointed service quota run continues in before the partial results are published"
+  type        = number
+}
+
+variable "service_quota_member_role_name" {
+  default     = null
+  description = "When set, service quotas are checked in every active account of the organization by assuming this role in each member account, and reported keyed by account. Must be deployed in the management account or a delegated administrator account"
+  type        = string
+}
+
+variable "service_quota_memory_size" {
+  default     = 512
+  description = "Memory (in MB) of the service quota Lambda. Raise it for organizations with many member accounts or large accounts"
+  type        = number
+}
+
+variable "service_quota_metric_lookback_minutes" {
+  default     = 10
+  description = "How far back (in minutes) to look for the latest CloudWatch usage metric datapoint for each service quota"
+  type        = number
+}
+
+variable "service_quota_region_concurrency" {
+  default     = 4
+  description = "Number of regions to check for service quota usage in parallel"
+  type        = number
+}
+
+variable "service_quota_schedule_full_sweep_runs" {
+  default     = 7
+  description = "Every quota is checked on every Nth run regardless of its usage history"
+  type        = number
+}
+
+variable "service_quota_schedule_max_interval" {
+  default     = 7
+  description = "Maximum number of runs between checks of a quota with low, flat usage. Quotas near the threshold or growing towards it are checked every run. Set to 1 to check every quota on every run. Usage history only persists between cold starts when service_quota_state_bucket is set"
+  type        = number
+}
+
+variable "service_quota_shard_service_group_size" {
+  default     = 25
+  description = "Number of services without custom usage checks bundled into one shard when service_quota_sharding is enabled"
+  type        = number
+}
+
+variable "service_quota_sharding" {
+  default     = false
+  description = "Split each service quota run into region and service shards checked by separate asynchronous invocations of the Lambda. The last shard to finish publishes the merged results, shards that fail for good are reported as errors. Requires service_quota_state_bucket"
+  type        = bool
+}
+
+variable "service_quota_state_bucket" {
+  default     = null
+  description = "Optional S3 bucket used to persist service quota monitoring state (e.g. the quota catalog) between runs. State is kept under the monitor_service_quotas/ prefix"
+  type        = string
+}
+
+variable "service_quota_telemetry" {
+  default     = false
+  description = "Record API call counts, latency, retries, throttles and pages per service, operation and region on every service quota run, and log them as CloudWatch embedded metrics"
+  type        = bool
+}
+
 variable "service_quota_threshold" {
   default     = 80
   description = "The threshold percentage for service quota alerts"
   type        = number
 }
 
+variable "service_quota_utilization_metrics" {
+  default     = false
+  description = "Log the usage, limit and percentage of every checked quota as CloudWatch embedded metrics, not only the quotas above the threshold"
+  type        = bool
+}
+
 variable "service_quota_region_list" {
   description = "List of regions to monitor for service quotas. Note that you cannot monitor across partitions (e.g. us-east-1 and us-gov-east-1)"
   type        = list(string)